@@ -1,15 +1,30 @@
 import os
-import re
+import argparse
 import pandas as pd
-from pydriller import Repository
+from contextlib import closing
 from sq_effect_study.analyse_sq_history import get_start_weeks_per_proj
-
-
-PATTERN = "[Ss]onar"
-
-
-def identify_sonar_issues(sys_name):
-    issues_path = f"experiment/data/input/{sys_name}_jira.csv"
+from sq_effect_study.commit_store import open_store, query_commits
+from sq_effect_study.config import LABEL_PATTERNS
+from sq_effect_study.issue_commit_index import (
+    INDEX_COLUMNS,
+    load_issue_commit_index,
+)
+from sq_effect_study.jira_query import get_jira_dump_fname
+
+
+PATTERN = LABEL_PATTERNS["sonar"]
+# The issue commit indexes of the systems, by their names
+ISSUE_INDEXES = {}
+
+
+def identify_sonar_issues(sys_name, analysis=None):
+    """With `analysis="sonar_issues"`, the smaller JIRA dump that was
+    collected for this analysis is read, see
+    `collect_jira_issues.py --analysis sonar_issues`.
+    """
+    issues_path = get_jira_dump_fname(
+        "experiment/data/input", sys_name, analysis
+    )
     sdf = pd.read_csv(issues_path)
     sdf.created = pd.to_datetime(sdf.created, utc=True)
 
@@ -23,54 +38,32 @@ def identify_sonar_issues(sys_name):
 
 
 def identify_sonar_commits(sys_name):
-    rows = []
-    pattern = re.compile(PATTERN)
-
     repo_path = os.path.join(os.environ["HOME"], "case_systems", sys_name)
 
-    for commit in Repository(path_to_repo=repo_path).traverse_commits():
-        if re.search(pattern, commit.msg):
-            rows.append(
-                (
-                    commit.project_name,
-                    commit.hash,
-                    commit.author_date,
-                    commit.msg,
-                )
-            )
-
-    df = pd.DataFrame(rows, columns=["project", "c_hash", "date", "msg"])
+    with closing(open_store(repo_path)) as conn:
+        sdf = query_commits(conn, sys_name, msg_pattern=PATTERN)
+    df = pd.DataFrame(
+        {
+            "project": sdf.project,
+            "c_hash": sdf.hash,
+            "date": sdf.author_date,
+            "msg": sdf.msg,
+        }
+    )
     return df
 
 
 def identify_commits_for_issue(iss_key, sys_name):
-    repo_path = os.path.join(os.environ["HOME"], "case_systems", sys_name)
+    """Looks the commits up in the index of the issue references of the
+    system, which is built once per version of the repository.
+    """
+    if sys_name not in ISSUE_INDEXES:
+        repo_path = os.path.join(os.environ["HOME"], "case_systems", sys_name)
+        ISSUE_INDEXES[sys_name] = load_issue_commit_index(sys_name, repo_path)
 
-    if sys_name == "daffodil":
-        # Daffodil puts ticket references in the end of the message, if at all
-        pattern = re.compile(f"{iss_key}$")
-    elif sys_name in ["hadoop-ozone", "ratis"]:
-        pattern = re.compile(f"{iss_key}\. ")
-    elif sys_name == "groovy":
-        pattern = re.compile(f"{iss_key}[:,]")
-    elif sys_name == "karaf":
-        pattern = re.compile(f"\[{iss_key}\]")
-
-    rows = []
-    for commit in Repository(path_to_repo=repo_path).traverse_commits():
-        if re.search(pattern, commit.msg):
-            rows.append(
-                (
-                    sys_name,
-                    iss_key,
-                    commit.hash,
-                    commit.author_date,
-                    commit.msg,
-                )
-            )
-    cols = ["project", "iss_key", "c_hash", "date", "msg"]
-    df = pd.DataFrame(rows, columns=cols)
-    return df
+    empty_df = pd.DataFrame([], columns=INDEX_COLUMNS)
+    df = ISSUE_INDEXES[sys_name].get(iss_key, empty_df)
+    return df.reset_index(drop=True)
 
 
 def print_start_days():
@@ -84,11 +77,15 @@ def print_start_days():
     print(start_df)
 
 
-def main():
+def main(planned_dumps=False):
+    """With `planned_dumps`, the issues are read from the JIRA dumps that
+    were collected for the `sonar_issues` analysis.
+    """
     systems = ["daffodil", "groovy", "hadoop-ozone", "karaf", "ratis"]
+    analysis = "sonar_issues" if planned_dumps else None
     sdfs = []
     for sys_name in systems:
-        sdf = identify_sonar_issues(sys_name)
+        sdf = identify_sonar_issues(sys_name, analysis=analysis)
         no_resolved_sonar_iss = sdf.shape[0]
         print(
             f"Number of resolved issues that mention `[Ss]onar for {sys_name}: {no_resolved_sonar_iss}"
@@ -141,22 +138,25 @@ def compute_sonar_commit_ratio(cdf, proj_name="ratis"):
 
     repo_path = os.path.join(os.environ["HOME"], "case_systems", proj_name)
 
-    rows = []
-    for commit in Repository(path_to_repo=repo_path).traverse_commits():
-        if commit.author_date >= start_dt:
-            rows.append(
-                (
-                    commit.hash,
-                    commit.author_date,
-                    commit.msg,
-                )
-            )
-    cols = ["c_hash", "date", "msg"]
-    df = pd.DataFrame(rows, columns=cols)
+    with closing(open_store(repo_path)) as conn:
+        sdf = query_commits(conn, proj_name, since=start_dt)
+    df = pd.DataFrame(
+        {"c_hash": sdf.hash, "date": sdf.author_date, "msg": sdf.msg}
+    )
     sonar_commit_ratio = cdf.shape[0] / df.shape[0]
 
     return sonar_commit_ratio, df
 
 
 if __name__ == "__main__":
-    main()
+    msg = "Identify the issues and commits that address Sonar findings."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "--planned-dumps",
+        action="store_true",
+        help="Read the JIRA dumps that collect_jira_issues.py --analysis "
+        + "sonar_issues collected.",
+    )
+
+    args = parser.parse_args()
+    main(planned_dumps=args.planned_dumps)
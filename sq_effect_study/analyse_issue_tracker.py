@@ -5,44 +5,66 @@ import numpy as np
 import pandas as pd
 from scipy import stats
 import matplotlib.pyplot as plt
-from sq_effect_study.config import PROJECTS_SQ, PROJECTS_JIRA, PROJECTS_BUGZILLA
+from sq_effect_study import dataset_cache
+from sq_effect_study.config import (
+    PROJECTS_SQ,
+    PROJECTS_JIRA,
+    PROJECTS_BUGZILLA,
+    PROJECTS_GH_ISSUES,
+)
 from sq_effect_study.analyse_sq_history import get_start_weeks_per_proj
+from sq_effect_study.jira_query import get_jira_dump_fname
 
 
 DATA_COLS = ["created_week", "bugs_per_week"]
 
 
-def create_bug_freq_df(data_path, project, kind="jira"):
+def create_bug_freq_df(data_path, project, kind="jira", analysis=None):
+    """With `analysis`, the JIRA dump that was collected for that analysis
+    is read, see `collect_jira_issues.py --analysis`.
+    """
     if kind == "jira":
         date_col = "created"
+        fname = get_jira_dump_fname(data_path, project, analysis)
     elif kind == "bugzilla":
         date_col = "Opened"
+        fname = os.path.join(data_path, f"{project}_{kind}.csv")
+    elif kind == "gh_issues":
+        # Collected with the columns of the JIRA dumps
+        date_col = "created"
+        fname = os.path.join(data_path, f"{project}_{kind}.csv")
 
-    df = pd.read_csv(
-        os.path.join(data_path, f"{project}_{kind}.csv"),
-        parse_dates=[date_col],
-        infer_datetime_format=True,
-    )
-    # The above date parsing does not seem to work properly, therefore
-    # cast it to datetimes
-    df[date_col] = pd.to_datetime(df[date_col], utc=True)
-
-    if kind == "jira":
-        # For JIRA there are labels that indicate if something is a bug
-        bug_df = df[df.issue_type == "Bug"].copy()
-    elif kind == "bugzilla":
-        # In Bugzilla everything is considered a bug
-        bug_df = df.copy()
-    bug_df["created_week"] = bug_df[date_col].dt.strftime("%Y%W")
+    def load():
+        df = pd.read_csv(
+            fname,
+            parse_dates=[date_col],
+            infer_datetime_format=True,
+        )
+        # The above date parsing does not seem to work properly, therefore
+        # cast it to datetimes
+        df[date_col] = pd.to_datetime(df[date_col], utc=True)
+
+        if kind in ("jira", "gh_issues"):
+            # For JIRA there are labels that indicate if something is a bug
+            bug_df = df[df.issue_type == "Bug"].copy()
+        elif kind == "bugzilla":
+            # In Bugzilla everything is considered a bug
+            bug_df = df.copy()
+        bug_df["created_week"] = bug_df[date_col].dt.strftime("%Y%W")
+
+        # Returns the amount of bugs per week
+        bug_freq = (
+            bug_df.groupby("created_week")
+            .size()
+            .reset_index(name="bugs_per_week")
+        )
+        bug_freq["project_gh"] = np.full(bug_freq.shape[0], project)
 
-    # Returns the amount of bugs per week
-    bug_freq = (
-        bug_df.groupby("created_week").size().reset_index(name="bugs_per_week")
-    )
-    bug_freq["project_gh"] = np.full(bug_freq.shape[0], project)
+        # TODO: fill week holes with zeros?
+        return bug_freq
 
-    # TODO: fill week holes with zeros?
-    return bug_freq
+    # Only the weekly frequencies are cached, not the whole issue dump
+    return dataset_cache.load(f"bug_freq_{kind}_{project}", [fname], load)
 
 
 def plot_bug_freqs_per_proj(df, start_df, figsize=(25, 25)):
@@ -93,9 +115,13 @@ def compute_stats(df, start_df):
     projs_to_check = []
     warnings.filterwarnings("ignore")
     for project_gh, df_proj in df.groupby("project_gh"):
-        start_dt = pd.to_datetime(
-            start_df[start_df.project_gh == project_gh].date.iloc[0]
-        )
+        proj_start_df = start_df[start_df.project_gh == project_gh]
+        if proj_start_df.empty:
+            # E.g., projects that track their issues on GitHub but have no
+            # SonarCloud history
+            print(f"Warning: no SonarCloud start date for {project_gh}")
+            continue
+        start_dt = pd.to_datetime(proj_start_df.date.iloc[0])
         lower_dt = np.datetime64(start_dt - pd.DateOffset(years=1))
         upper_dt = np.datetime64(start_dt + pd.DateOffset(years=1))
 
@@ -138,11 +164,13 @@ def compute_stats(df, start_df):
     return projs_to_check
 
 
-def get_bug_frequencies_as_df(inpath):
+def get_bug_frequencies_as_df(inpath, analysis=None):
     dfs = []
     for proj_gh in PROJECTS_JIRA.keys():
         try:
-            df = create_bug_freq_df(inpath, proj_gh, kind="jira")
+            df = create_bug_freq_df(
+                inpath, proj_gh, kind="jira", analysis=analysis
+            )
             dfs.append(df)
         except FileNotFoundError:
             pass
@@ -152,6 +180,12 @@ def get_bug_frequencies_as_df(inpath):
             dfs.append(df)
         except FileNotFoundError:
             pass
+    for proj_gh in PROJECTS_GH_ISSUES.keys():
+        try:
+            df = create_bug_freq_df(inpath, proj_gh, kind="gh_issues")
+            dfs.append(df)
+        except FileNotFoundError:
+            pass
 
     df = pd.concat(dfs, ignore_index=True)
 
@@ -161,8 +195,17 @@ def get_bug_frequencies_as_df(inpath):
     return df
 
 
-def main(inpath, outpath):
-    df = get_bug_frequencies_as_df(inpath)
+def main(inpath, outpath, planned_dumps=False):
+    """With `planned_dumps`, the plot and the statistics each read the JIRA
+    dumps that were collected for them, see `collect_jira_issues.py
+    --analysis bug_frequencies --analysis bug_stats`.
+    """
+    if planned_dumps:
+        df = get_bug_frequencies_as_df(inpath, analysis="bug_frequencies")
+        stats_df = get_bug_frequencies_as_df(inpath, analysis="bug_stats")
+    else:
+        df = get_bug_frequencies_as_df(inpath)
+        stats_df = df
 
     start_df = get_start_weeks_per_proj(inpath)
     # week_w_day = start_df.week.astype(str) + "1"
@@ -171,7 +214,7 @@ def main(inpath, outpath):
     fname = "bug_evolve.png"
     fig.savefig(os.path.join(outpath, fname), bbox_inches="tight")
 
-    compute_stats(df, start_df)
+    compute_stats(stats_df, start_df)
     # q = (
     #     (df.project_gh == "daffodil")
     #     | (df.project_gh == "groovy")
@@ -197,9 +240,15 @@ if __name__ == "__main__":
         type=str,
         help="Path",
     )
+    parser.add_argument(
+        "--planned-dumps",
+        action="store_true",
+        help="Read the JIRA dumps that collect_jira_issues.py --analysis "
+        + "collected for the plot and for the statistics.",
+    )
 
     args = parser.parse_args()
-    main(args.inpath, args.outpath)
+    main(args.inpath, args.outpath, planned_dumps=args.planned_dumps)
 
     # projects = collect_projects(args.inpath)
     # bug_freqs = get_bug_freqs_per_proj(projects)
@@ -4,21 +4,30 @@ import argparse
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from sq_effect_study import dataset_cache
 from sq_effect_study.config import PROJECTS_SQ
-from sq_effect_study.collect_jira_issues import filter_projects
 
 
 DATA_COLS = ["date", "no_bugs", "no_code_smells", "no_vulnerabilities"]
 
 
-def filter_projects(data_path):
-    from sq_effect_study.analyse_sq_history import get_start_weeks_per_proj
-
+def load_commits(data_path):
+    """Returns the commits that mention SonarQube from `commits.csv`, see
+    `collect_gh_repos.py`.
+    """
     commits_csv = os.path.join(data_path, "commits.csv")
-    commits_df = pd.read_csv(commits_csv)
-    # Just to be sure that these are really dates
-    commits_df.date = pd.to_datetime(commits_df.date, utc=True)
 
+    def load():
+        commits_df = pd.read_csv(commits_csv)
+        # Just to be sure that these are really dates
+        commits_df.date = pd.to_datetime(commits_df.date, utc=True)
+        return commits_df
+
+    return dataset_cache.load("commits", [commits_csv], load)
+
+
+def filter_projects(data_path):
+    commits_df = load_commits(data_path)
     fst_commits_df = commits_df.groupby("project").date.min().reset_index()
     sq_start_df = get_start_weeks_per_proj(data_path)
 
@@ -28,6 +37,22 @@ def filter_projects(data_path):
     return list(fst_commits_df[q].project)
 
 
+def read_sq_history(fname, proj_gh_name):
+    def load():
+        df = pd.read_csv(
+            fname,
+            parse_dates=["date"],
+            infer_datetime_format=True,
+        )
+        # The above date parsing does not seem to work properly, therefore
+        # cast it to datetimes
+        df.date = pd.to_datetime(df.date, utc=True)
+        df["project_gh"] = np.full(df.shape[0], proj_gh_name)
+        return df
+
+    return dataset_cache.load(f"sq_history_{proj_gh_name}", [fname], load)
+
+
 def get_sq_data_as_df(path, projects):
     """Returns a list of DataFrames with a DataFrame for each project, for
     which a SonarCloud history exists.
@@ -35,16 +60,8 @@ def get_sq_data_as_df(path, projects):
     dfs = []
     for proj_gh_name, proj_sq_id in projects.items():
         if proj_sq_id:
-            df = pd.read_csv(
-                os.path.join(path, f"{proj_gh_name}.csv"),
-                parse_dates=["date"],
-                infer_datetime_format=True,
-            )
-            # The above date parsing does not seem to work properly, therefore
-            # cast it to datetimes
-            df.date = pd.to_datetime(df.date, utc=True)
-            df["project_gh"] = np.full(df.shape[0], proj_gh_name)
-            dfs.append(df)
+            fname = os.path.join(path, f"{proj_gh_name}.csv")
+            dfs.append(read_sq_history(fname, proj_gh_name))
 
     df = pd.concat(dfs, ignore_index=True)
     return df
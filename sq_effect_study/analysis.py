@@ -1,9 +1,15 @@
 import pandas as pd
-from pydriller import Repository
-from sq_effect_study.analyse_sq_history import get_start_weeks_per_proj
+from contextlib import closing
+from sq_effect_study.analyse_sq_history import (
+    get_start_weeks_per_proj,
+    load_commits,
+)
+from sq_effect_study.commit_store import open_store, query_commits
+from sq_effect_study.git_mining import iter_commits
+from sq_effect_study.text_labels import TextLabeler
 
 
-cdf = pd.read_csv("experiment/data/input/commits.csv")
+cdf = load_commits("experiment/data/input")
 cdf[cdf.project == "ratis"]
 
 start_df = get_start_weeks_per_proj("experiment/data/input")
@@ -41,7 +47,7 @@ repo_path = os.path.join(os.environ["HOME"], "case_systems", "ratis")
 
 rows = []
 for iss_key in reversed(list(sdf[q].key.values)):
-    for commit in Repository(path_to_repo=repo_path).traverse_commits():
+    for commit in iter_commits(repo_path):
         if commit.msg.startswith(f"{iss_key}. "):
             rows.append(
                 (
@@ -81,7 +87,7 @@ iss_keys = [
 ]
 rows = []
 for iss_key in iss_keys:
-    for commit in Repository(path_to_repo=repo_path).traverse_commits():
+    for commit in iter_commits(repo_path):
         if commit.msg.startswith(f"{iss_key}. "):
             rows.append(
                 (
@@ -138,32 +144,21 @@ for iss_key in iss_keys:
 #   'RATIS-1367. Add null check for RaftConfigurationImpl (#469)')]
 
 
-for commit in Repository(path_to_repo=repo_path).traverse_commits():
-    if "indbugs" in commit.msg:
-
-        print(
-            (
-                commit.hash,
-                # commit.author_date,
-                commit.msg,
-            )
-        )
+labeler = TextLabeler()
+with closing(open_store(repo_path)) as conn:
+    ratis_cdf = query_commits(conn, "ratis")
+q = ["findbugs" in labels for labels in ratis_cdf.msg.map(labeler.label)]
+print(ratis_cdf[q][["hash", "msg"]])
 
 # Daffodil has two resolved issues that mention "sonar" (DAFFODIL-2291, DAFFODIL-2300) both are only concerning the setup of the tool
 # https://issues.apache.org/jira/browse/DAFFODIL-2291?jql=project%20%3D%20DAFFODIL%20AND%20text%20~%20%22sonar%22%20ORDER%20BY%20priority%20DESC%2C%20updated%20DESC
 # There are eight commits that mention "sonar" but only one commit (https://github.com/apache/daffodil/commit/075ed018d786d332deddc5e20169939f95470fef) is addressing issues reported by SQ, where empty methods are filled with comments first after the drop in smells
 
 repo_path = os.path.join(os.environ["HOME"], "case_systems", "daffodil")
-for commit in Repository(path_to_repo=repo_path).traverse_commits():
-    if "smell" in commit.msg:
-
-        print(
-            (
-                commit.hash,
-                # commit.author_date,
-                commit.msg,
-            )
-        )
+with closing(open_store(repo_path)) as conn:
+    daffodil_cdf = query_commits(conn, "daffodil")
+q = ["code_smell" in labels for labels in daffodil_cdf.msg.map(labeler.label)]
+print(daffodil_cdf[q][["hash", "msg"]])
 
 # I only find one commit in Daffodil that mentions fixing a code smell
 
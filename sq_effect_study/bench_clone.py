@@ -0,0 +1,71 @@
+"""Compares the clone strategies of `git_mining.CLONE_STRATEGIES` on a
+remote repository, e.g., `https://github.com/apache/groovy.git`.
+
+Every strategy clones the repository into a fresh directory. The report
+shows the time of the clone, the disk use of the clone, and the time that
+mining all commit messages from it takes.
+"""
+import os
+import shutil
+import argparse
+import tempfile
+from time import perf_counter
+from tabulate import tabulate
+from sq_effect_study.git_mining import (
+    CLONE_STRATEGIES,
+    clone_repo,
+    iter_commits,
+)
+
+
+def get_disk_use(path):
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(path)
+        for f in files
+        if not os.path.islink(os.path.join(root, f))
+    )
+
+
+def main(url, outpath=None):
+    rows = []
+    for strategy in CLONE_STRATEGIES.keys():
+        clone_to = tempfile.mkdtemp(prefix=f"{strategy}-", dir=outpath)
+        try:
+            start = perf_counter()
+            repo_path = clone_repo(url, clone_to, strategy=strategy)
+            clone_time = perf_counter() - start
+
+            start = perf_counter()
+            no_commits = sum(1 for _ in iter_commits(repo_path))
+            mining_time = perf_counter() - start
+
+            disk_use = get_disk_use(repo_path) / 1024**2
+            rows.append(
+                (strategy, clone_time, disk_use, no_commits, mining_time)
+            )
+        finally:
+            shutil.rmtree(clone_to)
+
+    headers = ["strategy", "clone [s]", "disk [MiB]", "commits", "mining [s]"]
+    print(tabulate(rows, headers=headers))
+
+
+if __name__ == "__main__":
+    msg = "Benchmark the clone strategies for mining commit messages."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "url",
+        metavar="url",
+        type=str,
+        help="URL of the repository to clone",
+    )
+    parser.add_argument(
+        "--outpath",
+        type=str,
+        default=None,
+        help="Directory for the temporary clones",
+    )
+
+    args = parser.parse_args()
+    main(args.url, outpath=args.outpath)
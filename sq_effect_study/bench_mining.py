@@ -0,0 +1,56 @@
+"""Compares the commit mining backends on a local clone of a repository,
+e.g., one of the clones in `~/case_systems`.
+
+The script fails if the backends do not yield identical commits.
+"""
+import argparse
+from time import perf_counter
+from tabulate import tabulate
+from sq_effect_study.git_mining import BACKENDS, iter_commits
+
+
+def run_backend(repo_path, backend):
+    start = perf_counter()
+    commits = list(iter_commits(repo_path, backend=backend))
+    return commits, perf_counter() - start
+
+
+def main(repo_path):
+    results = {}
+    rows = []
+    for backend in BACKENDS.keys():
+        results[backend], duration = run_backend(repo_path, backend)
+        no_commits = len(results[backend])
+        rows.append(
+            (backend, no_commits, duration, duration / max(no_commits, 1))
+        )
+    print(
+        tabulate(
+            rows, headers=["backend", "commits", "total [s]", "commit [s]"]
+        )
+    )
+
+    reference = results["pydriller"]
+    for backend, commits in results.items():
+        assert len(commits) == len(reference), (
+            f"{backend} yielded {len(commits)} instead of {len(reference)} "
+            + "commits"
+        )
+        for expected, actual in zip(reference, commits):
+            assert expected == actual, (
+                f"{backend} yielded {actual} instead of {expected}"
+            )
+
+
+if __name__ == "__main__":
+    msg = "Benchmark the mining of commit messages from a local repository."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "repo_path",
+        metavar="repo_path",
+        type=str,
+        help="Path to a local clone of a repository",
+    )
+
+    args = parser.parse_args()
+    main(args.repo_path)
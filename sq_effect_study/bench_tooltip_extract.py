@@ -0,0 +1,100 @@
+"""Compares the tooltip extraction backends on saved SonarCloud activity
+pages. Pages can be saved with `collect_sq_data.py --save-pages <dir>`,
+which names them `<project>_<date>_<kind>.html`. Only the values of the
+kind of a page are extracted from it.
+
+The script fails if the backends do not extract identical tooltip rows or
+identical values from any of the pages.
+"""
+import os
+import argparse
+from time import perf_counter
+from tabulate import tabulate
+from sq_effect_study.tooltip_extract import EXTRACTORS
+from sq_effect_study.collect_sq_data import (
+    get_tooltip_class,
+    scrape_analysis_value,
+)
+
+
+KINDS = ("ISSUES", "COVERAGE", "DUPLICATIONS")
+
+
+def get_kind(fname):
+    return fname.removesuffix(".html").rsplit("_", 1)[-1]
+
+
+def run_backend(pages, backend):
+    results = []
+    start = perf_counter()
+    for kind, page_source in pages:
+        vals = scrape_analysis_value(
+            page_source, None, kind=kind, backend=backend
+        )
+        results.append(vals)
+    return results, perf_counter() - start
+
+
+def main(inpath):
+    fnames = sorted(
+        f
+        for f in os.listdir(inpath)
+        if os.path.isfile(os.path.join(inpath, f))
+        and f.endswith(".html")
+        and get_kind(f) in KINDS
+    )
+    pages = []
+    for fname in fnames:
+        with open(os.path.join(inpath, fname)) as fp:
+            pages.append((get_kind(fname), fp.read()))
+
+    results = {}
+    rows = []
+    for backend in EXTRACTORS.keys():
+        results[backend], duration = run_backend(pages, backend)
+        rows.append(
+            (
+                backend,
+                len(pages),
+                duration,
+                duration / len(pages),
+            )
+        )
+    print(
+        tabulate(rows, headers=["backend", "pages", "total [s]", "page [s]"])
+    )
+
+    # The values fold the rows into a dict, which hides rows that are missed
+    # or extracted more than once as long as the last row of a type is right
+    for fname, (kind, page_source) in zip(fnames, pages):
+        css_class = get_tooltip_class(kind)
+        expected = EXTRACTORS["html5lib"](page_source, css_class)
+        for backend, extract_rows in EXTRACTORS.items():
+            actual = extract_rows(page_source, css_class)
+            assert expected == actual, (
+                f"{backend} extracted the rows {actual} instead of "
+                + f"{expected} from {fname}"
+            )
+
+    reference = results["html5lib"]
+    for backend, vals in results.items():
+        for idx, (expected, actual) in enumerate(zip(reference, vals)):
+            fname = fnames[idx]
+            assert expected == actual, (
+                f"{backend} extracted {actual} instead of {expected} "
+                + f"from {fname}"
+            )
+
+
+if __name__ == "__main__":
+    msg = "Benchmark the extraction of values from saved SonarCloud pages."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "inpath",
+        metavar="inpath",
+        type=str,
+        help="Path to a directory with saved page sources",
+    )
+
+    args = parser.parse_args()
+    main(args.inpath)
@@ -0,0 +1,82 @@
+"""A pool of headless Firefox sessions for scraping the SonarCloud web
+interface.
+
+Browser sessions are only started when the first page is requested from a
+worker. Each session is replaced by a fresh one after it loaded a
+configurable amount of pages, so that the memory used by Firefox stays
+bounded during long collection runs.
+"""
+import queue
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+
+def create_browser():
+    options = Options()
+    options.headless = True
+    return webdriver.Firefox(options=options)
+
+
+class BrowserWorker:
+    def __init__(self, recycle_after=100, timeout=30):
+        self.recycle_after = recycle_after
+        self.timeout = timeout
+        self.driver = None
+        self.no_pages = 0
+
+    def get_page_source(self, url, wait_for_class=None):
+        if self.driver and self.no_pages >= self.recycle_after:
+            self.close()
+        if not self.driver:
+            self.driver = create_browser()
+
+        self.driver.get(url)
+        self.no_pages += 1
+        if wait_for_class:
+            # Wait until the page is rendered instead of for a fixed time
+            try:
+                WebDriverWait(self.driver, self.timeout).until(
+                    EC.presence_of_all_elements_located(
+                        (By.CLASS_NAME, wait_for_class)
+                    )
+                )
+            except TimeoutException:
+                print(f"Timed out waiting for {wait_for_class} on {url}")
+
+        return self.driver.page_source
+
+    def close(self):
+        if self.driver:
+            self.driver.quit()
+        self.driver = None
+        self.no_pages = 0
+
+
+class BrowserPool:
+    def __init__(self, size=2, recycle_after=100, timeout=30):
+        self.size = size
+        self._workers = [
+            BrowserWorker(recycle_after=recycle_after, timeout=timeout)
+            for _ in range(size)
+        ]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def get_page_source(self, url, wait_for_class=None):
+        """Loads the page with the next idle browser. Blocks while all
+        browsers of the pool are busy.
+        """
+        worker = self._idle.get()
+        try:
+            return worker.get_page_source(url, wait_for_class=wait_for_class)
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
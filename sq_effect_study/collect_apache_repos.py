@@ -20,88 +20,333 @@ servicecomb-toolkit https://github.com/apache/servicecomb-toolkit
 ```
 
 These, are analyzed manually for inclusion in `config.py`
+
+The repositories are screened cheap-first: the filters on the metadata of
+the repository listing run before the configuration files of the remaining
+repositories are requested, many repositories per GraphQL query. A report
+on stderr shows how many API calls each stage saved. The verdicts are kept
+in a screening cache, so that later runs only examine the repositories
+that were pushed to since.
 """
+import os
 import sys
+import hashlib
+import argparse
 from os import getenv
-from github import Github
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 from dateutil.parser import parse
+from tabulate import tabulate
+from sq_effect_study import (
+    github_graphql,
+    http_cache,
+    http_client,
+    rate_limit,
+)
+from sq_effect_study.json_state import load_state, save_state
 
 
 INCLUSION_DATE = parse("1. Jan 2020")
+# The base URLs can be pointed to the local stand-in server of `replay.py`
+GH_API_BASE_URL = getenv("GH_API_BASE_URL", "https://api.github.com/")
+# Requests per second to the GitHub API. Authenticated clients may send
+# 5000 requests per hour, i.e., about 1.4 per second.
+GH_RATE = 1.0
+# Raw file contents do not count against the API rate limit and can be cached
+GH_RAW_BASE_URL = getenv(
+    "GH_RAW_BASE_URL", "https://raw.githubusercontent.com/"
+)
+
+
+def get_org_repos(org, ttl=None):
+    """Lists all repositories of a GitHub organization with the attributes
+    of PyGithub's repository objects that are used here. Requests go through
+    the response cache, so that the listing can be cached and recorded.
+    """
+    headers = {"Authorization": f"token {getenv('GITHUB_API_KEY')}"}
+    repos = []
+    page = 1
+    while True:
+        url = GH_API_BASE_URL + f"orgs/{org}/repos?per_page=100&page={page}"
+        r = http_cache.get(url, headers=headers, ttl=ttl)
+        repo_dicts = r.json()
+        if not repo_dicts:
+            break
+        for repo_dict in repo_dicts:
+            # Empty repositories were never pushed to
+            pushed_at = repo_dict["pushed_at"]
+            repos.append(
+                SimpleNamespace(
+                    name=repo_dict["name"],
+                    full_name=repo_dict["full_name"],
+                    html_url=repo_dict["html_url"],
+                    default_branch=repo_dict["default_branch"],
+                    stargazers_count=repo_dict["stargazers_count"],
+                    # Naive UTC datetimes like in PyGithub
+                    updated_at=parse(repo_dict["updated_at"]).replace(
+                        tzinfo=None
+                    ),
+                    pushed_at=pushed_at
+                    and parse(pushed_at).replace(tzinfo=None),
+                )
+            )
+        page += 1
+    return repos
+
+
+def get_file_contents(repo, path):
+    url = GH_RAW_BASE_URL + f"{repo.full_name}/{repo.default_branch}/{path}"
+    r = http_cache.get(url)
+    if r.status_code != 200:
+        raise FileNotFoundError(url)
+    return r.content
+
+
+# The cheap filters only need the metadata of the repository listing. They
+# are applied in this order, before any configuration file is requested.
+METADATA_FILTERS = (
+    # No incubator project
+    ("not incubator", lambda repo: "incubator" not in repo.name),
+    # No website project
+    (
+        "no website",
+        lambda repo: "-site" not in repo.name and "-website" not in repo.name,
+    ),
+    # Is still active, which means it has an update in 2020
+    ("updated since 2020", lambda repo: repo.updated_at >= INCLUSION_DATE),
+    # Project has to be reasonable popular
+    ("50 stars", lambda repo: repo.stargazers_count >= 50),
+)
+# Configuration files that point to SonarQube or SonarCloud, with the
+# content that they have to contain. The SonarQube configuration itself
+# counts if it exists.
+SONAR_CONFIG_FILES = (
+    ("sonar-project.properties", b""),
+    ("pom.xml", b"<sonar.host.url>"),
+    (".travis.yml", b"sonarcloud:"),
+    ("gradle.properties", b"org.sonarqube.version"),
+)
+# Repositories whose configuration files are requested in one query
+REPOS_PER_QUERY = 20
+# Verdicts on the configuration files of the repositories of the last runs.
+# They are reused as long as nothing was pushed to a repository since.
+SCREENING_CACHE_FNAME = getenv(
+    "SQ_EFFECT_SCREENING_CACHE",
+    os.path.join(
+        os.path.expanduser("~"), ".cache", "sq_effect_study", "screening.json"
+    ),
+)
+
+
+def passes_metadata_filters(repo):
+    return all(criterion(repo) for _, criterion in METADATA_FILTERS)
+
+
+def has_sonar_config(config_files):
+    """`config_files` maps the paths of `SONAR_CONFIG_FILES` to their
+    contents or to `None` if the repository does not contain them.
+    """
+    return any(
+        config_files.get(path) is not None and pattern in config_files[path]
+        for path, pattern in SONAR_CONFIG_FILES
+    )
 
 
 def filter_criteria(repo):
-    if "incubator" in repo.name:
-        # No incubator project
-        return False
-    if repo.updated_at < INCLUSION_DATE:
-        # Is still active, which means it has an update in 2020
-        return False
-    if "-site" in repo.name:
-        # No website project
-        return False
-    if "-website" in repo.name:
-        # No website project
-        return False
-    if repo.stargazers_count < 50:
-        # Project has to be reasonable popular
+    if not passes_metadata_filters(repo):
         return False
 
-    sonar_file = False
-    try:
-        # Check if the project contains a SonarQube configuration
-        # Check it at the end as it is expensive
-        repo.get_contents("sonar-project.properties")
-        sonar_file = True
-    except:
-        pass
-
-    try:
-        # Check if the project contains a Maven Configuration that points
-        # to something SonarQube related
-        pom_contents = repo.get_contents("pom.xml").decoded_content
-        if b"<sonar.host.url>" in pom_contents:
-            sonar_file = True
-    except:
-        pass
-
-    try:
-        # Check if the project contains a Maven Configuration that points
-        # to something SonarQube related
-        travis_contents = repo.get_contents(".travis.yml").decoded_content
-        if b"sonarcloud:" in travis_contents:
-            sonar_file = True
-    except:
-        pass
-
-    try:
-        # Check if the project contains a Maven Configuration that points
-        # to something SonarQube related
-        gradle_contents = repo.get_contents("gradle.properties").decoded_content
-        if b"org.sonarqube.version" in gradle_contents:
-            sonar_file = True
-    except:
-        pass
-
-    if not sonar_file:
-        return False
-    return True
+    # Check the configuration files at the end as it is expensive
+    config_files = {}
+    for path, _ in SONAR_CONFIG_FILES:
+        try:
+            config_files[path] = get_file_contents(repo, path)
+        except FileNotFoundError:
+            config_files[path] = None
+    return has_sonar_config(config_files)
+
+
+def get_config_files_query(repos):
+    aliases = []
+    for i, repo in enumerate(repos):
+        owner, name = repo.full_name.split("/")
+        files = "defaultBranchRef { name }" + "".join(
+            f"""
+            f{j}: object(expression: "HEAD:{path}") {{
+                ... on Blob {{ text }}
+            }}"""
+            for j, (path, _) in enumerate(SONAR_CONFIG_FILES)
+        )
+        aliases.append(
+            f'r{i}: repository(owner: "{owner}", name: "{name}") {{{files}}}'
+        )
+    rate_limit_fields = github_graphql.RATE_LIMIT_FIELDS
+    return f"query {{ {' '.join(aliases)} {rate_limit_fields} }}"
+
 
+def get_config_files(repos):
+    """Requests the configuration files of all `repos` in one GraphQL query.
+    Returns a list with the files of each repository, see
+    `has_sonar_config`. The files are `None` for repositories that could not
+    be read or that have no default branch, e.g., renamed or empty ones.
+    """
+    data = github_graphql.query(get_config_files_query(repos))
+    config_files = []
+    for i, _ in enumerate(repos):
+        repo_data = data.get(f"r{i}")
+        if not repo_data or not repo_data.get("defaultBranchRef"):
+            config_files.append(None)
+            continue
+        files = {}
+        for j, (path, _) in enumerate(SONAR_CONFIG_FILES):
+            blob = repo_data.get(f"f{j}")
+            if blob is None:
+                files[path] = None
+            else:
+                # Binary files have no text
+                files[path] = (blob.get("text") or "").encode()
+        config_files.append(files)
+    return config_files
 
-def collect_possible_repos():
+
+def load_screening_cache(fname=SCREENING_CACHE_FNAME):
+    return load_state(fname)
+
+
+def save_screening_cache(screening_cache, fname=SCREENING_CACHE_FNAME):
+    save_state(fname, screening_cache)
+
+
+def get_pushed_at(repo):
+    # Empty repositories have no push date and count as changed in every run
+    return repo.pushed_at and repo.pushed_at.isoformat()
+
+
+def get_screening_entry(repo, config_files):
+    return {
+        "pushed_at": get_pushed_at(repo),
+        "files": {
+            path: None
+            if content is None
+            else hashlib.sha256(content).hexdigest()
+            for path, content in config_files.items()
+        },
+        "sonar_config": has_sonar_config(config_files),
+    }
+
+
+def screen_repos(repos, no_workers=4, screening_cache=None):
+    """Applies the metadata filters first and then requests the
+    configuration files of the remaining candidates in batches, with
+    `no_workers` queries at a time. Returns the repositories that pass and
+    a report of how many API calls each stage saved compared to requesting
+    every configuration file of every repository one by one.
+
+    Candidates that were not pushed to since their entry in the
+    `screening_cache` keep their verdict. The cache is updated in place,
+    but only with the verdicts on repositories whose files could be read.
+    """
+    if screening_cache is None:
+        screening_cache = {}
+    calls_per_repo = len(SONAR_CONFIG_FILES)
+    report = [["listed", len(repos), 0]]
+    candidates = repos
+    for name, criterion in METADATA_FILTERS:
+        remaining = [repo for repo in candidates if criterion(repo)]
+        saved = (len(candidates) - len(remaining)) * calls_per_repo
+        report.append([name, len(remaining), saved])
+        candidates = remaining
+
+    changed = [
+        repo
+        for repo in candidates
+        if repo.pushed_at is None
+        or screening_cache.get(repo.full_name, {}).get("pushed_at")
+        != get_pushed_at(repo)
+    ]
+    saved = (len(candidates) - len(changed)) * calls_per_repo
+    report.append(["pushed since last run", len(changed), saved])
+
+    batches = [
+        changed[idx : idx + REPOS_PER_QUERY]
+        for idx in range(0, len(changed), REPOS_PER_QUERY)
+    ]
+    with ThreadPoolExecutor(max_workers=no_workers) as executor:
+        batch_files = list(executor.map(get_config_files, batches))
+    for batch, files in zip(batches, batch_files):
+        for repo, config_files in zip(batch, files):
+            if config_files is None:
+                print(f"Cannot screen {repo.full_name}", file=sys.stderr)
+                continue
+            screening_cache[repo.full_name] = get_screening_entry(
+                repo, config_files
+            )
+
+    selected = [
+        repo
+        for repo in candidates
+        if screening_cache.get(repo.full_name, {}).get("sonar_config")
+    ]
+    saved = len(changed) * calls_per_repo - len(batches)
+    report.append(["sonar config (batched)", len(selected), saved])
+    return selected, report
+
+
+def print_screening_report(report):
+    headers = ["stage", "repositories", "API calls saved"]
+    print(tabulate(report, headers=headers), file=sys.stderr)
+    total = sum(row[2] for row in report)
+    print(f"Saved {total} API calls in total", file=sys.stderr)
+
+
+def collect_possible_repos(no_workers=4, rescreen=False):
     if not getenv("GITHUB_API_KEY"):
         sys.exit("GITHUB_API_KEY must be set as environment variable")
-    g = Github(login_or_token=getenv("GITHUB_API_KEY"))
-    repos = [r for r in g.get_organization("apache").get_repos()]
+    # The push dates of the listing decide which repositories changed
+    repos = get_org_repos("apache", ttl=0)
 
-    return list(filter(filter_criteria, repos))
+    screening_cache = {} if rescreen else load_screening_cache()
+    selected, report = screen_repos(
+        repos, no_workers=no_workers, screening_cache=screening_cache
+    )
+    save_screening_cache(screening_cache)
+    print_screening_report(report)
+    return selected
 
 
-def main():
-    repos = collect_possible_repos()
+def main(no_workers=4, rescreen=False, rps=GH_RATE):
+    # The listing and the GraphQL queries share the limit of the API. The
+    # burst lets the workers start their first queries together.
+    for url in (GH_API_BASE_URL, github_graphql.GH_GRAPHQL_URL):
+        rate_limit.configure(url, rps, burst=no_workers)
+    repos = collect_possible_repos(no_workers=no_workers, rescreen=rescreen)
     for r in repos:
         print(r.name, r.html_url)
+    http_client.print_metrics()
+    github_graphql.print_cost()
 
 
 if __name__ == "__main__":
-    main()
+    msg = "Find repositories of the ASF that use SonarQube or SonarCloud."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of GraphQL queries that are sent concurrently.",
+    )
+    parser.add_argument(
+        "--rescreen",
+        action="store_true",
+        help="Ignore the verdicts of previous runs.",
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        default=GH_RATE,
+        help="Maximum number of requests per second to the GitHub API. "
+        + "SQ_EFFECT_RPS overrides it.",
+    )
+
+    args = parser.parse_args()
+    main(no_workers=args.workers, rescreen=args.rescreen, rps=args.rps)
@@ -0,0 +1,161 @@
+"""Collects the issues of the projects that track them on GitHub, see
+`config.PROJECTS_GH_ISSUES`.
+
+The issues are paged with the cursors of the GraphQL API, 100 issues per
+page, and the pages of several repositories are requested in one query.
+The issues are written to `<project>_gh_issues.csv` with the columns of the
+JIRA dumps, so that they are analyzed like those. Issues that carry one of
+the `BUG_LABELS` are of type `Bug`, their titles are the summaries.
+"""
+import os
+import sys
+import argparse
+import pandas as pd
+from dateutil.parser import parse
+from sq_effect_study import github_graphql, http_client
+from sq_effect_study.collect_jira_issues import JIRA_COLUMNS
+from sq_effect_study.config import PROJECTS_GH_ISSUES
+
+
+GH_ORG = "apache"
+PAGE_LENGTH = 100
+REPOS_PER_QUERY = 5
+BUG_LABELS = ("bug", "type: bug", "kind/bug")
+
+ISSUE_FIELDS = """
+    id
+    number
+    title
+    state
+    createdAt
+    closedAt
+    updatedAt
+    labels(first: 20) { nodes { name } }
+"""
+
+
+def get_issues_query(repo_names):
+    """Builds a query for the next page of issues of each repository. The
+    cursor of the previous page of repository `i` is the variable `$c<i>`.
+    """
+    variables = ", ".join(f"$c{i}: String" for i in range(len(repo_names)))
+    aliases = "".join(
+        f"""
+        r{i}: repository(owner: "{GH_ORG}", name: "{repo_name}") {{
+            issues(
+                first: {PAGE_LENGTH}
+                after: $c{i}
+                orderBy: {{ field: CREATED_AT, direction: ASC }}
+            ) {{
+                pageInfo {{ hasNextPage endCursor }}
+                nodes {{ {ISSUE_FIELDS} }}
+            }}
+        }}"""
+        for i, repo_name in enumerate(repo_names)
+    )
+    rate_limit_fields = github_graphql.RATE_LIMIT_FIELDS
+    return f"query({variables}) {{ {aliases} {rate_limit_fields} }}"
+
+
+def parse_gh_issue(issue):
+    """Returns the values of an issue in the order of `JIRA_COLUMNS`."""
+    labels = [label["name"] for label in issue["labels"]["nodes"]]
+    if any(label.lower() in BUG_LABELS for label in labels):
+        issue_type = "Bug"
+    else:
+        issue_type = "Issue"
+    created = parse(issue["createdAt"])
+    resolution = issue["closedAt"] and parse(issue["closedAt"])
+    updated = parse(issue["updatedAt"])
+
+    values = {
+        "issue_type": issue_type,
+        "labels": labels,
+        "created": created,
+        "resolution": resolution,
+        "updated": updated,
+        "status": issue["state"],
+        "id": issue["id"],
+        "key": f"#{issue['number']}",
+        "summary": issue["title"],
+    }
+    return tuple(values.get(column) for column in JIRA_COLUMNS)
+
+
+def iter_issue_pages(repo_names):
+    """Yields the repository name and the issues of every page. Each query
+    asks for the next page of up to `REPOS_PER_QUERY` repositories that
+    have pages left. The issues are `None` for repositories that cannot be
+    accessed, which are given up.
+    """
+    cursors = {repo_name: None for repo_name in repo_names}
+    while cursors:
+        batch = list(cursors.keys())[:REPOS_PER_QUERY]
+        print(f"Getting issues of {', '.join(batch)}...")
+        text = get_issues_query(batch)
+        variables = {f"c{i}": cursors[name] for i, name in enumerate(batch)}
+        data = github_graphql.query(text, variables)
+
+        for i, repo_name in enumerate(batch):
+            repo = data.get(f"r{i}")
+            if not repo:
+                print(f"Cannot access the issues of {repo_name}")
+                del cursors[repo_name]
+                yield repo_name, None
+                continue
+            issues = repo["issues"]
+            yield repo_name, issues["nodes"]
+            if issues["pageInfo"]["hasNextPage"]:
+                cursors[repo_name] = issues["pageInfo"]["endCursor"]
+            else:
+                del cursors[repo_name]
+
+
+def collect_from_gh(outpath, force_recollections=False):
+    fnames = {}
+    for proj_gh_name, repo_name in PROJECTS_GH_ISSUES.items():
+        fname = os.path.join(outpath, f"{proj_gh_name}_gh_issues.csv")
+        if not force_recollections and os.path.isfile(fname):
+            print(f"Found {fname}, will not recreate it...")
+            continue
+        fnames[repo_name] = fname
+        empty_df = pd.DataFrame([], columns=JIRA_COLUMNS)
+        empty_df.to_csv(f"{fname}.part", index=False)
+
+    for repo_name, issues in iter_issue_pages(list(fnames.keys())):
+        part_fname = f"{fnames[repo_name]}.part"
+        if issues is None:
+            # Only complete dumps are written
+            os.remove(part_fname)
+            del fnames[repo_name]
+            continue
+        rows = [parse_gh_issue(issue) for issue in issues]
+        df = pd.DataFrame(rows, columns=JIRA_COLUMNS)
+        df.to_csv(part_fname, mode="a", header=False, index=False)
+
+    for fname in fnames.values():
+        print(f"Writing {fname}...")
+        os.replace(f"{fname}.part", fname)
+
+
+if __name__ == "__main__":
+    msg = "Collect issues from GitHub."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "outpath",
+        metavar="outpath",
+        type=str,
+        help="Path",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Overwrite previously collected issue dumps.",
+    )
+
+    args = parser.parse_args()
+    if not os.getenv("GITHUB_API_KEY"):
+        sys.exit("GITHUB_API_KEY must be set as environment variable")
+    collect_from_gh(args.outpath, force_recollections=args.force)
+    http_client.print_metrics()
+    github_graphql.print_cost()
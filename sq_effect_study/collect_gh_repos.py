@@ -1,24 +1,58 @@
 import os
 import re
 import argparse
-from pydriller import Repository
-from sq_effect_study.config import PROJECTS_SQ
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sq_effect_study.config import PROJECTS_SQ, LABEL_PATTERNS
+from sq_effect_study.json_state import load_state, save_state
+from sq_effect_study.git_mining import (
+    CLONE_STRATEGIES,
+    clone_repo,
+    get_head,
+    is_ancestor,
+    iter_commits,
+)
 import pandas as pd
 
 
-PATTERN = "[Ss]onar"
+PATTERN = LABEL_PATTERNS["sonar"]
+COMMIT_COLUMNS = ["project", "c_hash", "date", "msg"]
+# Stores the head commit of every mined repository
+MINING_STATE_FNAME = "mining_state.json"
 
 
-def collect_sq_commits(projs_to_check, outpath):
-    rows = []
-    gh_repos = [f"https://github.com/apache/{el}.git" for el in projs_to_check]
+def load_mining_state(outpath):
+    return load_state(os.path.join(outpath, MINING_STATE_FNAME))
+
+
+def save_mining_state(outpath, state):
+    save_state(os.path.join(outpath, MINING_STATE_FNAME), state)
+
+
+def mine_sq_commits(
+    proj_gh_name, clone_to, fetch=False, strategy="full", last_hash=None
+):
+    """Clones the project's repository and returns its commits that mention
+    Sonar, the commit at its head, whether the whole history was scanned,
+    and the time it took. Runs in a worker process.
+
+    With `last_hash`, only the commits after it are scanned, unless it is
+    not in the history anymore, e.g., after a force push.
+    """
+    start = perf_counter()
+    gh_repo = f"https://github.com/apache/{proj_gh_name}.git"
     pattern = re.compile(PATTERN)
 
-    repo_path = os.path.join(os.environ["HOME"], "case_systems")
+    repo_path = clone_repo(gh_repo, clone_to, fetch=fetch, strategy=strategy)
+    head = get_head(repo_path)
+    rev = "HEAD"
+    if last_hash and is_ancestor(repo_path, last_hash, head):
+        rev = f"{last_hash}..{head}"
+    elif last_hash:
+        print(f"The history of {proj_gh_name} was rewritten, rescanning...")
 
-    for commit in Repository(
-        path_to_repo=gh_repos, clone_repo_to=repo_path
-    ).traverse_commits():
+    rows = []
+    for commit in iter_commits(repo_path, rev=rev):
         if re.search(pattern, commit.msg):
             rows.append(
                 (
@@ -28,16 +62,92 @@ def collect_sq_commits(projs_to_check, outpath):
                     commit.msg,
                 )
             )
+    return rows, head, rev == "HEAD", perf_counter() - start
+
+
+def collect_sq_commits(
+    projs_to_check,
+    outpath,
+    no_workers=None,
+    fetch=False,
+    strategy="full",
+    incremental=False,
+):
+    """Mines the repositories in `no_workers` processes, by default one per
+    core. The commits are written in the order of `projs_to_check`, so that
+    the result does not depend on which worker finishes first.
+
+    The head commit of every mined repository is its high-water mark in
+    `mining_state.json`. With `incremental`, the repositories are fetched
+    and only the commits after their mark are appended to `commits.csv`.
+    """
+    repo_path = os.path.join(os.environ["HOME"], "case_systems")
+    fname = os.path.join(outpath, "commits.csv")
+
+    state = load_mining_state(outpath)
+    old_df = pd.DataFrame([], columns=COMMIT_COLUMNS)
+    if incremental and os.path.isfile(fname):
+        old_df = pd.read_csv(fname)
+    else:
+        state = {}
+    fetch = fetch or incremental
 
-    df = pd.DataFrame(rows, columns=["project", "c_hash", "date", "msg"])
-    df.to_csv(os.path.join(outpath, "commits.csv"), index=False)
+    results = {}
+    rescanned = set()
+    with ProcessPoolExecutor(max_workers=no_workers) as executor:
+        futures = {
+            executor.submit(
+                mine_sq_commits,
+                proj,
+                repo_path,
+                fetch,
+                strategy,
+                state.get(proj),
+            ): proj
+            for proj in projs_to_check
+        }
+        for idx, future in enumerate(as_completed(futures), start=1):
+            proj = futures[future]
+            results[proj], head, full_scan, duration = future.result()
+            state[proj] = head
+            if full_scan:
+                rescanned.add(proj)
+            print(
+                f"Mined {proj} in {duration:.1f}s, "
+                + f"{len(results[proj])} new commits mention Sonar "
+                + f"({idx}/{len(futures)})"
+            )
+
+    # Previously mined projects that are not mined again are kept as is
+    old_df = old_df[~old_df.project.isin(rescanned)]
+    projs = list(projs_to_check) + [
+        p for p in old_df.project.unique() if p not in projs_to_check
+    ]
+    dfs = []
+    for proj in projs:
+        dfs.append(old_df[old_df.project == proj])
+        new_rows = results.get(proj, [])
+        dfs.append(pd.DataFrame(new_rows, columns=COMMIT_COLUMNS))
+    df = pd.concat(dfs, ignore_index=True)
+    df.to_csv(fname, index=False)
+    # Only move the marks once the commits are written
+    save_mining_state(outpath, state)
     return df
 
 
-def main(outpath):
+def main(
+    outpath, no_workers=None, fetch=False, strategy="full", incremental=False
+):
 
     projs_to_check = list(PROJECTS_SQ.keys())
-    commits_df = collect_sq_commits(projs_to_check, outpath)
+    commits_df = collect_sq_commits(
+        projs_to_check,
+        outpath,
+        no_workers=no_workers,
+        fetch=fetch,
+        strategy=strategy,
+        incremental=incremental,
+    )
     commits_df.to_csv(os.path.join(outpath, "commits.csv"), index=False)
 
     # commits_df.groupby("project").date.min()
@@ -79,6 +189,37 @@ if __name__ == "__main__":
         type=str,
         help="Path",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of repositories that are mined in parallel processes. "
+        + "Defaults to the number of cores.",
+    )
+    parser.add_argument(
+        "--fetch",
+        action="store_true",
+        help="Pull the latest commits into previously cloned repositories.",
+    )
+    parser.add_argument(
+        "--clone-strategy",
+        choices=list(CLONE_STRATEGIES.keys()),
+        default="full",
+        help="How to clone repositories that were not cloned before. The "
+        + "partial clones contain only what mining the messages needs.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Fetch the repositories and append only the commits since "
+        + "the last run to commits.csv.",
+    )
 
     args = parser.parse_args()
-    main(args.outpath)
+    main(
+        args.outpath,
+        no_workers=args.workers,
+        fetch=args.fetch,
+        strategy=args.clone_strategy,
+        incremental=args.incremental,
+    )
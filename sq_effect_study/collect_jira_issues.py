@@ -1,18 +1,33 @@
 import os
-import re
 import argparse
-import requests
 import pandas as pd
-from time import sleep
 from io import StringIO
 from dateutil.parser import parse
+from itertools import islice
+from urllib.parse import quote_plus
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from sq_effect_study import http_cache, http_client, rate_limit
+from sq_effect_study.jira_query import (
+    ANALYSIS_NEEDS,
+    get_jira_dump_fname,
+    plan_analysis_query,
+)
 from sq_effect_study.config import PROJECTS_JIRA, PROJECTS_BUGZILLA
+from sq_effect_study.json_state import load_state, save_state
 
 
-JIRA_API_BASE_URL = "https://issues.apache.org/jira/"
-BUGZILLA_BASE_URL = "https://bz.apache.org/bugzilla/buglist.cgi"
+# The base URLs can be pointed to the local stand-in server of `replay.py`
+JIRA_API_BASE_URL = os.getenv(
+    "JIRA_API_BASE_URL", "https://issues.apache.org/jira/"
+)
+BUGZILLA_BASE_URL = os.getenv(
+    "BUGZILLA_BASE_URL", "https://bz.apache.org/bugzilla/buglist.cgi"
+)
 BUGZILLA_BUG_URL = "https://bz.apache.org/bugzilla/show_bug.cgi"
 PAGE_LENGTH = 500
+# Stores the newest `updated` timestamp of the issues in each JIRA dump
+WATERMARKS_FNAME = "jira_watermarks.json"
 
 JIRA_COLUMNS = (
     "issue_type",
@@ -30,142 +45,422 @@ JIRA_COLUMNS = (
     "status",
     "id",
     "key",
+    "summary",
+)
+JIRA_FIELDS = (
+    "id",
+    "key",
+    "priority",
+    "labels",
+    "versions",
+    "status",
+    "components",
+    "creator",
+    "reporter",
+    "issuetype",
+    "description",
+    "summary",
+    "resolutiondate",
+    "created",
+    "updated",
 )
 
+# The exports from Bugzilla are large, leave the server some time between them
+rate_limit.configure(BUGZILLA_BASE_URL, 1 / 30)
+# Sliced exports request the bugs opened in a year at a time. The first
+# slice holds all bugs opened before the start date.
+BZ_START_DATE = "2001-01-01"
+BZ_SLICE_LENGTH = "12MS"
+# Slices with this many bugs are split, as the server may cut off larger ones
+BZ_SLICE_LIMIT = 1000
+# Requests per second for sliced exports unless `--bz-rps` is given. Slices
+# are small compared to full exports, so the server gets them at the rate of
+# the JIRA pages instead of one every 30 seconds.
+BZ_SLICED_RATE = 1.0
+BZ_MIN_DATE = pd.Timestamp("1998-01-01")
+
 PROJECT_KEYS = list(PROJECTS_JIRA.keys()) + list(PROJECTS_BUGZILLA.keys())
 
 
-def filter_projects(data_path):
-    from sq_effect_study.analyse_sq_history import get_start_weeks_per_proj
+def get_project_jql(proj_jira_id):
+    return f"project={proj_jira_id} order by created"
+
 
-    commits_csv = os.path.join(data_path, "commits.csv")
-    commits_df = pd.read_csv(commits_csv)
-    # Just to be sure that these are really dates
-    commits_df.date = pd.to_datetime(commits_df.date, utc=True)
+def get_jira_search_url(
+    jql, start_idx, page_length=PAGE_LENGTH, fields=None
+):
+    if fields is None:
+        fields = JIRA_FIELDS
+    return (
+        JIRA_API_BASE_URL
+        + f"rest/api/2/search?jql={quote_plus(jql, safe='=')}"
+        + f"&issuetypeNames=Bug&maxResults={page_length}&"
+        + f"startAt={start_idx}&fields={','.join(fields)}"
+    )
 
-    fst_commits_df = commits_df.groupby("project").date.min().reset_index()
-    sq_start_df = get_start_weeks_per_proj(data_path)
 
-    # Get only those systems that do not have a commit that mentions SonarQube
-    # more than a month before it was actually used
-    q = (sq_start_df.date - fst_commits_df.date).astype("timedelta64[D]") < 30
-    return list(fst_commits_df[q].project)
+def parse_jira_issue(issue):
+    # Fields that were not requested are missing and result in empty columns
+    fields = issue["fields"]
+
+    # fields["issuetype"]["description"]
+    issuetype = fields.get("issuetype") or {}
+    issue_type = issuetype.get("name", None)
+
+    issue_component = [c["name"] for c in issuetype.get("components", [])]
+    creator = fields.get("creator")
+    if creator:
+        creator_name = creator.get("name", None)
+        creator_display_name = creator.get("displayName", None)
+    else:
+        creator_name = None
+        creator_display_name = None
+
+    reporter = fields.get("reporter")
+    if reporter:
+        reporter_name = reporter.get("name", None)
+        reporter_display_name = reporter.get("displayName", None)
+    else:
+        reporter_name = None
+        reporter_display_name = None
+
+    priority = fields.get("priority")
+    if priority:
+        priority = priority.get("name", None)
+
+    summary = fields.get("summary")
+    description = fields.get("description")
+    labels = fields.get("labels")
+
+    created = fields.get("created")
+    if created:
+        created = parse(created)
+    resolution = fields.get("resolutiondate")
+    if resolution:
+        resolution = parse(resolution)
+    updated = fields.get("updated")
+    if updated:
+        updated = parse(updated)
+    status = (fields.get("status") or {}).get("name", None)
+
+    id_val = issue["id"]
+    key_val = issue["key"]
+
+    return (
+        issue_type,
+        issue_component,
+        creator_name,
+        creator_display_name,
+        reporter_name,
+        reporter_display_name,
+        priority,
+        description,
+        labels,
+        created,
+        resolution,
+        updated,
+        status,
+        id_val,
+        key_val,
+        summary,
+    )
 
 
-def collect_from_jira(outpath, force_recollections=False):
+def get_jira_page(
+    jql, start_idx, page_length=PAGE_LENGTH, ttl=None, fields=None
+):
+    url = get_jira_search_url(jql, start_idx, page_length, fields)
+    end_idx = start_idx + page_length
+    print(f"Getting data for index {start_idx} to {end_idx}...")
+    r = http_cache.get(url, ttl=ttl)
+    return r.json()
+
+
+def iter_jira_pages(jql, start_idx=0, no_workers=4, ttl=None, fields=None):
+    """Yields the pages of all issues matching the `jql` query, starting at
+    `start_idx`. The first page tells how many issues there are,
+    so that the following pages are requested concurrently by `no_workers`
+    threads. At most twice as many pages as workers are requested ahead, so
+    that only a few pages are held in memory at a time.
+    """
+    r_dict = get_jira_page(jql, start_idx, ttl=ttl, fields=fields)
+    yield r_dict
+
+    # The server may return less issues per page than requested
+    page_length = r_dict["maxResults"] or PAGE_LENGTH
+    start_idxs = iter(
+        range(start_idx + page_length, r_dict["total"], page_length)
+    )
+    with ThreadPoolExecutor(max_workers=no_workers) as executor:
+        futures = deque(
+            executor.submit(
+                get_jira_page, jql, idx, page_length, ttl, fields
+            )
+            for idx in islice(start_idxs, 2 * no_workers)
+        )
+        while futures:
+            page = futures.popleft().result()
+            for idx in islice(start_idxs, 1):
+                futures.append(
+                    executor.submit(
+                        get_jira_page, jql, idx, page_length, ttl, fields
+                    )
+                )
+            yield page
+
+
+def write_jira_dump(jql, fname, no_workers=4, ttl=None, fields=None):
+    """Appends the rows of every page to `<fname>.part` as soon as the page
+    is parsed. After each page, the index of the next issue is stored in
+    `<fname>.progress`, from which an interrupted collection resumes. The
+    partial dump is moved to `fname` once all pages are written.
+    """
+    part_fname = f"{fname}.part"
+    progress_fname = f"{fname}.progress"
+
+    start_idx = 0
+    seen_ids = set()
+    if os.path.isfile(part_fname) and os.path.isfile(progress_fname):
+        with open(progress_fname) as fp:
+            start_idx = int(fp.read())
+        seen_ids = set(pd.read_csv(part_fname, usecols=["id"]).id.astype(str))
+        print(f"Resuming {part_fname} at index {start_idx}...")
+    else:
+        pd.DataFrame([], columns=JIRA_COLUMNS).to_csv(part_fname, index=False)
+
+    for page in iter_jira_pages(jql, start_idx, no_workers, ttl, fields):
+        # The above `issuetypeNames=Bug` should limit the response to bugs
+        # only but the response for `WW` contains more issue types. So I
+        # have to filter later ...
+        rows = [
+            parse_jira_issue(issue)
+            for issue in page["issues"]
+            # Pages overlap when issues were deleted while paging
+            if issue["id"] not in seen_ids
+        ]
+        seen_ids.update(issue["id"] for issue in page["issues"])
+
+        df = pd.DataFrame(rows, columns=JIRA_COLUMNS)
+        df.to_csv(part_fname, mode="a", header=False, index=False)
+        with open(progress_fname, "w") as fp:
+            fp.write(str(page["startAt"] + len(page["issues"])))
+
+    os.replace(part_fname, fname)
+    os.remove(progress_fname)
+
+
+def load_watermarks(outpath):
+    return load_state(os.path.join(outpath, WATERMARKS_FNAME))
+
+
+def save_watermarks(outpath, watermarks):
+    save_state(os.path.join(outpath, WATERMARKS_FNAME), watermarks)
+
+
+def get_max_updated(fname):
+    df = pd.read_csv(fname, usecols=["updated"])
+    return pd.to_datetime(df.updated, utc=True).max()
+
+
+def sync_jira_dump(proj_jira_id, fname, watermark, no_workers=4):
+    """Requests only the issues that were updated since the `watermark` and
+    upserts them into the existing dump by their `id`. Returns the new
+    watermark.
+    """
+    # JQL compares dates to the minute and in the time zone of the server.
+    # Go back a day to not miss updates, issues that are requested twice are
+    # replaced by the upsert anyways
+    since = (watermark - pd.Timedelta(days=1)).strftime("%Y/%m/%d %H:%M")
+    jql = (
+        f'project={proj_jira_id} and updated >= "{since}" order by created'
+    )
+    delta_fname = f"{fname}.delta"
+    # Cached responses would hide the latest updates
+    write_jira_dump(jql, delta_fname, no_workers=no_workers, ttl=0)
+
+    delta_df = pd.read_csv(delta_fname)
+    print(f"Upserting {delta_df.shape[0]} updated issues into {fname}...")
+    df = pd.concat([pd.read_csv(fname), delta_df], ignore_index=True)
+    df = df.drop_duplicates(subset="id", keep="last")
+    created = pd.to_datetime(df.created, utc=True)
+    df = df.iloc[created.argsort(kind="stable")]
+    df.to_csv(f"{fname}.tmp", index=False)
+    os.replace(f"{fname}.tmp", fname)
+    os.remove(delta_fname)
+
+    if delta_df.empty:
+        return watermark
+    return max(watermark, pd.to_datetime(delta_df.updated, utc=True).max())
+
+
+def collect_from_jira(
+    outpath, force_recollections=False, no_workers=4, incremental=False
+):
     print(PROJECT_KEYS)
+    watermarks = load_watermarks(outpath)
     for proj_gh_name, proj_jira_id in PROJECTS_JIRA.items():
         if (proj_gh_name not in PROJECT_KEYS) or (not proj_jira_id):
             continue
         fname = os.path.join(outpath, f"{proj_gh_name}_jira.csv")
-        if not force_recollections:
-            if os.path.isfile(fname):
-                print(f"Found {fname}, will not recreate it...")
-                continue
+        watermark = None
+        if incremental and os.path.isfile(fname):
+            if proj_gh_name in watermarks:
+                watermark = pd.Timestamp(watermarks[proj_gh_name])
+            else:
+                # Dumps from before the incremental mode existed
+                watermark = get_max_updated(fname)
+            # Dumps without issues have no watermark and are collected again
+            if pd.isna(watermark):
+                watermark = None
+
+        if watermark is not None:
+            print(f"Syncing {fname} with updates since {watermark}...")
+            watermark = sync_jira_dump(
+                proj_jira_id, fname, watermark, no_workers=no_workers
+            )
+        elif force_recollections or incremental or not os.path.isfile(fname):
+            print(f"Collecting data from {proj_gh_name} into {fname}...")
+            jql = get_project_jql(proj_jira_id)
+            write_jira_dump(jql, fname, no_workers=no_workers)
+            watermark = get_max_updated(fname)
+        else:
+            print(f"Found {fname}, will not recreate it...")
+            continue
 
-        print(f"Collecting data from {proj_gh_name}...")
-        sleep(5)
-
-        rows = []
-        start_idx = 0
-        url = (
-            JIRA_API_BASE_URL
-            + f"rest/api/2/search?jql=project={proj_jira_id}+order+by+created"
-            + f"&issuetypeNames=Bug&maxResults={PAGE_LENGTH}&"
-            + f"startAt={start_idx}&fields=id,key,priority,labels,versions,"
-            + "status,components,creator,reporter,issuetype,description,"
-            + "summary,resolutiondate,created,updated"
-        )
+        if pd.isna(watermark):
+            continue
+        watermarks[proj_gh_name] = watermark.isoformat()
+        save_watermarks(outpath, watermarks)
 
-        print(f"Getting data from {url}...")
-        r = requests.get(url)
-        r_dict = r.json()
-
-        while start_idx < r_dict["total"]:
-            sleep(2)
-
-            # The above `issuetypeNames=Bug` should limit the response to bugs
-            # only but the response for `WW` contains more issue types. So I
-            # have to filter later ...
-            for idx in range(len(r_dict["issues"])):
-                fields = r_dict["issues"][idx]["fields"]
-
-                # fields["issuetype"]["description"]
-                issue_type = fields["issuetype"]["name"]
-
-                issue_component = [
-                    c["name"] for c in fields["issuetype"].get("components", [])
-                ]
-                creator = fields["creator"]
-                if creator:
-                    creator_name = creator.get("name", None)
-                    creator_display_name = creator.get("displayName", None)
-                else:
-                    creator_name = None
-                    creator_display_name = None
-
-                reporter = fields["reporter"]
-                if reporter:
-                    reporter_name = reporter.get("name", None)
-                    reporter_display_name = reporter.get("displayName", None)
-                else:
-                    reporter_name = None
-                    reporter_display_name = None
-
-                priority = fields["priority"]
-                if priority:
-                    priority = priority.get("name", None)
-
-                description = fields["description"]
-                labels = fields["labels"]
-
-                created = fields["created"]
-                if created:
-                    created = parse(created)
-                resolution = fields["resolutiondate"]
-                if resolution:
-                    resolution = parse(resolution)
-                updated = fields["updated"]
-                if updated:
-                    updated = parse(updated)
-                status = fields["status"]["name"]
-
-                id_val = r_dict["issues"][idx]["id"]
-                key_val = r_dict["issues"][idx]["key"]
-
-                rows.append(
-                    (
-                        issue_type,
-                        issue_component,
-                        creator_name,
-                        creator_display_name,
-                        reporter_name,
-                        reporter_display_name,
-                        priority,
-                        description,
-                        labels,
-                        created,
-                        resolution,
-                        updated,
-                        status,
-                        id_val,
-                        key_val,
-                    )
-                )
 
-            start_idx += PAGE_LENGTH
-            url = re.sub(r"startAt=\d+&", f"startAt={start_idx}&", url)
-            inner_idx = start_idx + PAGE_LENGTH
-            print(f"Getting data for index {start_idx} to {inner_idx}...")
-            r = requests.get(url)
-            r_dict = r.json()
+def collect_for_analyses(
+    outpath, analyses, force_recollections=False, no_workers=4
+):
+    """Collects for each analysis only the issues and fields it uses into
+    `<project>_jira_<analysis>.csv`.
+    """
+    from sq_effect_study.analyse_sq_history import get_start_weeks_per_proj
 
-        print(f"Writing {fname} for {proj_gh_name}...")
-        df = pd.DataFrame(rows, columns=JIRA_COLUMNS)
-        df.to_csv(fname, index=False)
+    start_df = None
+    for proj_gh_name, proj_jira_id in PROJECTS_JIRA.items():
+        if (proj_gh_name not in PROJECT_KEYS) or (not proj_jira_id):
+            continue
+        for analysis in analyses:
+            fname = get_jira_dump_fname(outpath, proj_gh_name, analysis)
+            if os.path.isfile(fname) and not force_recollections:
+                print(f"Found {fname}, will not recreate it...")
+                continue
 
+            start_date = None
+            if "created_window" in ANALYSIS_NEEDS[analysis]:
+                if start_df is None:
+                    start_df = get_start_weeks_per_proj(outpath)
+                q = start_df.project_gh == proj_gh_name
+                start_date = start_df[q].date.iloc[0]
+
+            jql, fields = plan_analysis_query(
+                analysis, proj_jira_id, start_date=start_date
+            )
+            print(f"Collecting `{jql}` into {fname}...")
+            write_jira_dump(jql, fname, no_workers=no_workers, fields=fields)
+
+
+def get_bz_export_url(proj_bz_id, opened_from=None, opened_before=None):
+    """The CSV export of the bugs of a product, optionally only of those
+    that were opened in the half-open range `[opened_from, opened_before)`.
+    """
+    url = (
+        BUGZILLA_BASE_URL
+        + f"?limit=0&product={proj_bz_id}&query_format=advanced&limit=0"
+        + "&ctype=csv&human=1&columnlist=bug_id,bug_severity,bug_status,"
+        + "component,reporter,reporter_realname,assigned_to,priority,"
+        + "short_desc,keywords,resolution,status_whiteboard,opendate,"
+        + "changeddate"
+    )
+    if opened_from is not None:
+        url += f"&f1=creation_ts&o1=greaterthaneq&v1={opened_from:%Y-%m-%d}"
+    if opened_before is not None:
+        url += f"&f2=creation_ts&o2=lessthan&v2={opened_before:%Y-%m-%d}"
+    if (opened_from is not None) or (opened_before is not None):
+        url = url.replace("limit=0", f"limit={BZ_SLICE_LIMIT}")
+    return url
+
+
+def get_bz_slices(start=BZ_START_DATE, length=BZ_SLICE_LENGTH):
+    """Splits the time from `start` until now into slices of `length`.
+    The first and the last slice are open-ended, so that no bug is missed.
+    """
+    bounds = list(pd.date_range(start, pd.Timestamp.now(), freq=length))
+    bounds = [None] + bounds + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def get_bz_slice(proj_bz_id, opened_from, opened_before):
+    """Returns the bugs that were opened in the slice. A slice that reaches
+    the limit of bugs per request or whose CSV is cut off is truncated and
+    is split into two halves, which are requested in turn.
+    """
+    url = get_bz_export_url(proj_bz_id, opened_from, opened_before)
+    print(f"Getting bugs opened from {opened_from} before {opened_before}...")
+    r = http_cache.get(url)
+    try:
+        df = pd.read_csv(StringIO(r.text))
+    except pd.errors.ParserError:
+        df = None
+    if (df is not None) and (df.shape[0] < BZ_SLICE_LIMIT):
+        return df
+
+    # The open-ended slices are closed by the dates around them
+    lower = opened_from if opened_from is not None else BZ_MIN_DATE
+    upper = opened_before
+    if upper is None:
+        upper = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+    middle = (lower + (upper - lower) / 2).normalize()
+    if middle <= lower:
+        # A single day cannot be split any further
+        if df is None:
+            raise ValueError(f"Cannot parse the bugs of {url}")
+        print(f"Warning: bugs of {url} are truncated")
+        return df
+    return pd.concat(
+        [
+            get_bz_slice(proj_bz_id, opened_from, middle),
+            get_bz_slice(proj_bz_id, middle, opened_before),
+        ],
+        ignore_index=True,
+    )
 
-def collect_from_bz(outpath, force_recollections=False):
+
+def write_bz_dump_sliced(proj_bz_id, fname, no_workers=4):
+    """Requests the bugs of the product in slices of their opening date,
+    `no_workers` slices concurrently. The slices are appended to
+    `<fname>.part` in the order of their dates as soon as they arrive.
+    """
+    part_fname = f"{fname}.part"
+    slices = iter(get_bz_slices())
+    seen_ids = set()
+    header = True
+    with ThreadPoolExecutor(max_workers=no_workers) as executor:
+        futures = deque(
+            executor.submit(get_bz_slice, proj_bz_id, *s)
+            for s in islice(slices, 2 * no_workers)
+        )
+        while futures:
+            df = futures.popleft().result()
+            for s in islice(slices, 1):
+                futures.append(executor.submit(get_bz_slice, proj_bz_id, *s))
+            df = df[~df["Bug ID"].isin(seen_ids)]
+            seen_ids.update(df["Bug ID"])
+            mode = "w" if header else "a"
+            df.to_csv(part_fname, mode=mode, header=header, index=False)
+            header = False
+
+    os.replace(part_fname, fname)
+
+
+def collect_from_bz(
+    outpath, force_recollections=False, sliced=False, no_workers=4
+):
     # Export the data from Bugzilla
     for proj_gh_name, proj_bz_id in PROJECTS_BUGZILLA.items():
         if (proj_gh_name not in PROJECT_KEYS) or (not proj_bz_id):
@@ -178,26 +473,21 @@ def collect_from_bz(outpath, force_recollections=False):
                 continue
 
         print(f"Collecting data from {proj_gh_name}...")
+        if sliced:
+            write_bz_dump_sliced(proj_bz_id, fname, no_workers=no_workers)
+            continue
 
-        url = (
-            BUGZILLA_BASE_URL
-            + f"?limit=0&product={proj_bz_id}&query_format=advanced&limit=0"
-            + "&ctype=csv&human=1&columnlist=bug_id,bug_severity,bug_status,"
-            + "component,reporter,reporter_realname,assigned_to,priority,"
-            + "short_desc,keywords,resolution,status_whiteboard,opendate,"
-            + "changeddate"
-        )
-
-        r = requests.get(url)
+        r = http_cache.get(get_bz_export_url(proj_bz_id))
         csv_str = StringIO(r.text)
         df = pd.read_csv(csv_str)
 
         print(f"Writing {fname} for {proj_gh_name}...")
         df.to_csv(fname, index=False)
-        sleep(30)
 
 
 def update_keys(data_path):
+    from sq_effect_study.analyse_sq_history import filter_projects
+
     global PROJECT_KEYS
     PROJECT_KEYS = filter_projects(data_path)
 
@@ -216,15 +506,79 @@ if __name__ == "__main__":
         action="store_true",
         help="Overwrite previously collected issue dumps.",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only download JIRA issues that were updated since the last "
+        + "collection and upsert them into the existing dumps.",
+    )
+    parser.add_argument(
+        "--analysis",
+        action="append",
+        choices=list(ANALYSIS_NEEDS.keys()),
+        help="Only download the JIRA issues and fields that the given "
+        + "analysis uses. Can be given multiple times.",
+    )
     parser.add_argument(
         "--filter",
         action="store_true",
         help="Only download the issue tracker data for relevant projects.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of JIRA pages or Bugzilla slices that are requested "
+        + "concurrently.",
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        default=1.0,
+        help="Maximum number of requests per second to the JIRA server.",
+    )
+    parser.add_argument(
+        "--bz-sliced",
+        action="store_true",
+        help="Export the bugs from Bugzilla in concurrent slices by the "
+        + "date they were opened.",
+    )
+    parser.add_argument(
+        "--bz-rps",
+        type=float,
+        default=None,
+        help="Maximum number of requests per second to the Bugzilla server. "
+        + "Defaults to one request per 30 seconds for full exports and to "
+        + f"{BZ_SLICED_RATE} for sliced ones.",
+    )
 
     args = parser.parse_args()
     if args.filter:
         update_keys(args.outpath)
 
-    collect_from_jira(args.outpath, force_recollections=args.force)
-    collect_from_bz(args.outpath, force_recollections=args.force)
+    rate_limit.configure(JIRA_API_BASE_URL, args.rps)
+    if args.analysis:
+        collect_for_analyses(
+            args.outpath,
+            args.analysis,
+            force_recollections=args.force,
+            no_workers=args.workers,
+        )
+    else:
+        collect_from_jira(
+            args.outpath,
+            force_recollections=args.force,
+            no_workers=args.workers,
+            incremental=args.incremental,
+        )
+    if args.bz_rps:
+        rate_limit.configure(BUGZILLA_BASE_URL, args.bz_rps)
+    elif args.bz_sliced:
+        rate_limit.configure(BUGZILLA_BASE_URL, BZ_SLICED_RATE)
+    collect_from_bz(
+        args.outpath,
+        force_recollections=args.force,
+        sliced=args.bz_sliced,
+        no_workers=args.workers,
+    )
+    http_client.print_metrics()
@@ -1,18 +1,31 @@
 import os
+import asyncio
 import argparse
-import requests
 import pandas as pd
-from time import sleep
-from bs4 import BeautifulSoup
 from datetime import timezone
-from selenium import webdriver
 from dateutil.parser import parse
+from concurrent.futures import ThreadPoolExecutor
+from sq_effect_study import http_cache, http_client, rate_limit
+from sq_effect_study.browser_pool import BrowserPool
+from sq_effect_study.tooltip_extract import EXTRACTORS
 from sq_effect_study.config import PROJECTS_SQ
 
-BROWSER = webdriver.Firefox()
+# Browsers are started on first use, see `main` for the configuration
+BROWSER_POOL = BrowserPool()
+EXTRACTOR = "fast"
+# If set, the source of every scraped page is stored in this directory
+PAGE_SOURCE_DIR = None
 TIME_FMT_STR = "%Y-%m-%dT%H%%3A%M%%3A%S%%2B0000"
-SQ_API_BASE_URL = "https://sonarcloud.io/api/project_analyses/search"
-SQ_WEB_BASE_URL = "https://sonarcloud.io/project/activity"
+# The base URLs can be pointed to the local stand-in server of `replay.py`
+SQ_API_BASE_URL = os.getenv(
+    "SQ_API_BASE_URL", "https://sonarcloud.io/api/project_analyses/search"
+)
+SQ_MEASURES_API_URL = os.getenv(
+    "SQ_MEASURES_API_URL", "https://sonarcloud.io/api/measures/search_history"
+)
+SQ_WEB_BASE_URL = os.getenv(
+    "SQ_WEB_BASE_URL", "https://sonarcloud.io/project/activity"
+)
 COLUMNS = (
     "project",
     "date",
@@ -30,19 +43,46 @@ COLUMNS = (
     # "dupl_lines",
     # "dupl_lines_perc",
 )
+# Metric keys of the `measures/search_history` API in the order of the values
+# in `COLUMNS`. The ratings of bugs, code smells, and vulnerabilities are
+# called reliability, maintainability (sqale), and security rating in the API
+API_METRICS = (
+    "bugs",
+    "reliability_rating",
+    "code_smells",
+    "sqale_rating",
+    "vulnerabilities",
+    "security_rating",
+)
+# The API reports ratings as numbers, the web interface shows letters
+RATINGS = {"1.0": "A", "2.0": "B", "3.0": "C", "4.0": "D", "5.0": "E"}
 
 
-def get_activity_from_sq_api(project):
-    idx = 1
-    responses = []
+def get_from_param(since):
+    if not since:
+        return ""
+    utc_since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return f"&from={utc_since.strftime(TIME_FMT_STR)}"
+
+
+def get_activity_from_sq_api(project, since=None, ttl=None):
     """Collects especially the dates when a project was analyzed. In essence,
     it collects everything that is in the left pane, for example of:
     https://sonarcloud.io/project/activity?id=simgrid_simgrid
+    With `since`, only analyses from that date on are collected. `ttl`
+    overrides the time for which cached responses are considered fresh.
     """
+    idx = 1
+    responses = []
+    from_param = get_from_param(since)
     while True:
         # Collecting pages from the `project_analyses` API
-        url = SQ_API_BASE_URL + f"?project={project}&ps=500&p={idx}"
-        r = requests.get(url)
+        url = (
+            SQ_API_BASE_URL
+            + f"?project={project}&ps=500&p={idx}"
+            + from_param
+        )
+        r = http_cache.get(url, ttl=ttl)
         proj_activity = r.json()
 
         responses.append(proj_activity)
@@ -52,7 +92,7 @@ def get_activity_from_sq_api(project):
         ):
             # Leave the loop once all values are collected
             break
-        sleep(2)  # Be kind to the sonarcloud server and prevent being banned
+        idx += 1
 
     analysis_rows = []
     for response in responses:
@@ -70,11 +110,79 @@ def get_activity_from_sq_api(project):
     return analysis_rows
 
 
+def get_measures_history_from_sq_api(
+    project, metrics=API_METRICS, since=None, ttl=None
+):
+    """Collects the values of all given metrics for every analysis of a
+    project. The `measures/search_history` API returns the history of up to
+    1000 analyses per metric in a single page, so that even projects with
+    hundreds of analyses need only one or two requests. Returns a dictionary
+    mapping the date of an analysis to a dictionary of metric values.
+    """
+    idx = 1
+    history = {}
+    from_param = get_from_param(since)
+    while True:
+        url = (
+            SQ_MEASURES_API_URL
+            + f"?component={project}&metrics={','.join(metrics)}"
+            + f"&ps=1000&p={idx}"
+            + from_param
+        )
+        r = http_cache.get(url, ttl=ttl)
+        proj_measures = r.json()
+
+        for measure in proj_measures["measures"]:
+            for entry in measure["history"]:
+                # Same format as the dates of the `project_analyses` API
+                date = parse(entry["date"])
+                values = history.setdefault(date, {})
+                values[measure["metric"]] = entry.get("value", None)
+
+        if proj_measures["paging"]["total"] <= (
+            proj_measures["paging"]["pageIndex"]
+            * proj_measures["paging"]["pageSize"]
+        ):
+            break
+        idx += 1
+
+    return history
+
+
+def convert_measure(metric, value):
+    if value is None:
+        return None
+    if metric.endswith("_rating"):
+        return RATINGS[value]
+    return int(value)
+
+
+def collect_analysis_values(project, analysis_rows, since=None, ttl=None):
+    """Creates the same rows as `scrape_analysis_values` but from the JSON
+    API instead of from the rendered activity pages.
+    """
+    history = get_measures_history_from_sq_api(project, since=since, ttl=ttl)
+
+    rows = []
+    for ana in analysis_rows:
+        try:
+            measures = history[ana[0]]
+        except KeyError:
+            date_str = ana[0].strftime("%Y-%m-%d:%H:%M")
+            print(f"Skipped {project} {date_str}")
+            continue
+        row = [convert_measure(m, measures.get(m, None)) for m in API_METRICS]
+        rows.append((project, ana[0], *row))
+    return rows
+
+
 def scrape_analysis_event(project, ana_row):
     vals = []
 
     html_src = get_analysis_page_src(project, ana_row, kind="ISSUES")
-    issue_vals = scrape_analysis_value(html_src, ana_row, kind="ISSUES")
+    issue_vals = scrape_analysis_value(
+        html_src, ana_row, kind="ISSUES", backend=EXTRACTOR
+    )
     # html_src = get_analysis_page_src(project, ana_row, kind="COVERAGE")
     # cov_vals = scrape_analysis_value(html_src, ana_row, kind="COVERAGE")
     # html_src = get_analysis_page_src(project, ana_row, kind="DUPLICATIONS")
@@ -93,21 +201,48 @@ def scrape_analysis_event(project, ana_row):
     return row
 
 
+def scrape_analysis_row(project, ana):
+    try:
+        row = scrape_analysis_event(project, ana)
+        # print(project, ana[0], *row)
+        if len(row) < 6:  # 13:
+            # print(row)
+            # print("oioioi!")
+            raise Exception("oioioi!")
+        return (project, ana[0], *row)
+    except IndexError as e:
+        date_str = ana[0].strftime("%Y-%m-%d:%H:%M")
+        print(f"Skipped {project} {date_str}")
+        return None
+
+
+def iter_analysis_values(project, analysis_rows):
+    """Yields the scraped rows in the order of `analysis_rows` as soon as
+    they are available. The analyses are spread over all browsers of the
+    pool.
+    """
+    executor = ThreadPoolExecutor(max_workers=BROWSER_POOL.size)
+    try:
+        rows = executor.map(
+            lambda ana: scrape_analysis_row(project, ana), analysis_rows
+        )
+        for row in rows:
+            if row:
+                yield row
+    finally:
+        # Do not scrape the remaining pages when a row failed
+        executor.shutdown(cancel_futures=True)
+
+
 def scrape_analysis_values(project, analysis_rows):
-    rows = []
-    for ana in analysis_rows:
-        try:
-            row = scrape_analysis_event(project, ana)
-            # print(project, ana[0], *row)
-            if len(row) < 6:  # 13:
-                # print(row)
-                # print("oioioi!")
-                raise Exception("oioioi!")
-            rows.append((project, ana[0], *row))
-        except IndexError as e:
-            date_str = ana[0].strftime("%Y-%m-%d:%H:%M")
-            print(f"Skipped {project} {date_str}")
-    return rows
+    return list(iter_analysis_values(project, analysis_rows))
+
+
+def get_tooltip_class(kind):
+    if kind == "ISSUES":
+        return "project-activity-graph-tooltip-issues-line"
+    elif (kind == "COVERAGE") or (kind == "DUPLICATIONS"):
+        return "project-activity-graph-tooltip-line"
 
 
 def get_analysis_page_src(project, analysis_row, kind="ISSUES"):
@@ -133,6 +268,8 @@ def get_analysis_page_src(project, analysis_row, kind="ISSUES"):
             + f"?graph=duplications&id={project}&selected_date={time_str}"
         )
 
+    tooltip_class = get_tooltip_class(kind)
+
     print(url)
     # if (
     #     url
@@ -140,30 +277,34 @@ def get_analysis_page_src(project, analysis_row, kind="ISSUES"):
     # ):
     #     print("oioioi")
 
-    BROWSER.get(url)
-    # Be kind to the sonarcloud server and prevent being banned. Additionally,
-    # wait for the page to be loaded
-    sleep(3)
+    rate_limit.wait(url)
+    # Returns as soon as the tooltip of the selected analysis is rendered
+    page_source = BROWSER_POOL.get_page_source(
+        url, wait_for_class=tooltip_class
+    )
+    if PAGE_SOURCE_DIR:
+        fname = f"{project}_{utc_datetime:%Y%m%dT%H%M%S}_{kind}.html"
+        with open(os.path.join(PAGE_SOURCE_DIR, fname), "w") as fp:
+            fp.write(page_source)
 
-    return BROWSER.page_source
+    return page_source
 
 
-def scrape_issues(src):
+def scrape_issues(tds, spans):
     # Order is: Bugs, Code Smells, Vulnerabilities
-    typ = src.find_all("td")[-1].text
-    value, rating = src.find_all("span")
-    value, rating = int(value.text.replace(",", "")), rating.text
+    typ = tds[-1]
+    value, rating = spans
+    value = int(value.replace(",", ""))
 
     return typ, value, rating
 
 
-def scrape_others(src):
-    tds = src.find_all("td")
-    typ = tds[-1].text.strip()
+def scrape_others(tds):
+    typ = tds[-1].strip()
     if typ == "Events:":
         return typ, None
     else:
-        val_str = tds[-2].text
+        val_str = tds[-2]
 
         if "k" in val_str:
             val_str = val_str.replace("k", "000").replace(".", "")
@@ -180,15 +321,11 @@ def scrape_others(src):
         return typ, value
 
 
-def scrape_analysis_value(page_source, analysis_row, kind="ISSUES"):
-    soup = BeautifulSoup(page_source, "html5lib")
-
-    if kind == "ISSUES":
-        attributes = {"class": "project-activity-graph-tooltip-issues-line"}
-    elif (kind == "COVERAGE") or (kind == "DUPLICATIONS"):
-        attributes = {"class": "project-activity-graph-tooltip-line"}
-
-    assessment = soup.find_all("tr", attrs=attributes)
+def scrape_analysis_value(
+    page_source, analysis_row, kind="ISSUES", backend="fast"
+):
+    css_class = get_tooltip_class(kind)
+    assessment = EXTRACTORS[backend](page_source, css_class)
     if kind == "ISSUES":
         results = {"Bugs": None, "Code Smells": None, "Vulnerabilities": None}
     elif kind == "COVERAGE":
@@ -205,14 +342,14 @@ def scrape_analysis_value(page_source, analysis_row, kind="ISSUES"):
             "Duplicated Lines (%)": None,
         }
 
-    for a in assessment:
+    for tds, spans in assessment:
         if kind == "ISSUES":
-            typ, value, rating = scrape_issues(a)
+            typ, value, rating = scrape_issues(tds, spans)
             # print(typ, (value, rating))
             results[typ] = (value, rating)
         else:
             # try:
-            typ, value = scrape_others(a)
+            typ, value = scrape_others(tds)
             # print(typ, (value,))
             if typ == "Events:":
                 continue
@@ -222,26 +359,116 @@ def scrape_analysis_value(page_source, analysis_row, kind="ISSUES"):
     return tuple(results.values())
 
 
-def main(outpath):
+def collect_project(proj_gh_name, proj_sq_id, fname, use_api=False):
+    print(f"Collecting info for {proj_gh_name} from Sonarcloud.")
+    analysis_rows = get_activity_from_sq_api(proj_sq_id)
+    # Make first analysis come first
+    analysis_rows = list(reversed(analysis_rows))
+    if use_api:
+        data = collect_analysis_values(proj_sq_id, analysis_rows)
+    else:
+        data = scrape_analysis_values(proj_sq_id, analysis_rows)
+
+    df = pd.DataFrame(data, columns=COLUMNS)
+    df.to_csv(fname, index=False)
+
+
+def get_newest_analysis_date(fname):
+    if not os.path.isfile(fname):
+        return None
+    df = pd.read_csv(fname, usecols=["date"])
+    if df.empty:
+        return None
+    return pd.to_datetime(df.date, utc=True).max()
+
+
+def append_rows(fname, rows):
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    write_header = not os.path.isfile(fname)
+    df.to_csv(fname, mode="a", header=write_header, index=False)
+
+
+def sync_project(proj_gh_name, proj_sq_id, fname, use_api=False):
+    """Appends the analyses that are newer than the newest one in `fname`.
+    Every scraped analysis is written right away, so that the newest date in
+    the file is a checkpoint from which an interrupted run resumes.
+    """
+    newest_date = get_newest_analysis_date(fname)
+    # Cached responses would hide analyses that happened since they were
+    # cached, so revalidate them
+    analysis_rows = get_activity_from_sq_api(
+        proj_sq_id, since=newest_date, ttl=0
+    )
+    # Make first analysis come first
+    analysis_rows = list(reversed(analysis_rows))
+    if newest_date is not None:
+        # The `from` parameter of the API includes the given date
+        analysis_rows = [a for a in analysis_rows if a[0] > newest_date]
+    print(f"Syncing {len(analysis_rows)} new analyses of {proj_gh_name}.")
+
+    if use_api:
+        data = collect_analysis_values(
+            proj_sq_id, analysis_rows, since=newest_date, ttl=0
+        )
+        append_rows(fname, data)
+    else:
+        for row in iter_analysis_values(proj_sq_id, analysis_rows):
+            append_rows(fname, [row])
+
+
+async def collect_projects(outpath, use_api=False, concurrency=4, sync=False):
+    """Collects the SonarCloud histories of many projects at once. Each
+    project is collected in its own thread, at most `concurrency` of them at
+    the same time. All of them share the rate limit of the SonarCloud host.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    if sync:
+        collect_func = sync_project
+    else:
+        collect_func = collect_project
+
+    async def collect(proj_gh_name, proj_sq_id, fname):
+        async with semaphore:
+            await asyncio.to_thread(
+                collect_func, proj_gh_name, proj_sq_id, fname, use_api
+            )
+
+    tasks = []
+    for proj_gh_name, proj_sq_id in PROJECTS_SQ.items():
+        fname = os.path.join(outpath, f"{proj_gh_name}.csv")
+        if proj_sq_id and (sync or not os.path.isfile(fname)):
+            tasks.append(collect(proj_gh_name, proj_sq_id, fname))
+        else:
+            print(f"Collecting nothing for {proj_gh_name} from Sonarcloud.")
+    await asyncio.gather(*tasks)
+
+
+def main(
+    outpath,
+    use_api=False,
+    concurrency=4,
+    rps=1.0,
+    no_browsers=2,
+    recycle_after=100,
+    sync=False,
+    extractor="fast",
+    page_source_dir=None,
+):
+    global BROWSER_POOL, EXTRACTOR, PAGE_SOURCE_DIR
+    BROWSER_POOL = BrowserPool(size=no_browsers, recycle_after=recycle_after)
+    EXTRACTOR = extractor
+    PAGE_SOURCE_DIR = page_source_dir
+
+    rate_limit.configure(SQ_API_BASE_URL, rps)
     try:
-        for proj_gh_name, proj_sq_id in PROJECTS_SQ.items():
-            fname = os.path.join(outpath, f"{proj_gh_name}.csv")
-            if proj_sq_id and not os.path.isfile(fname):
-                print(f"Collecting info for {proj_gh_name} from Sonarcloud.")
-                analysis_rows = get_activity_from_sq_api(proj_sq_id)
-                # Make first analysis come first
-                analysis_rows = list(reversed(analysis_rows))
-                data = scrape_analysis_values(proj_sq_id, analysis_rows)
-
-                df = pd.DataFrame(data, columns=COLUMNS)
-                df.to_csv(fname, index=False)
-            else:
-                print(f"Collecting nothing for {proj_gh_name} from Sonarcloud.")
-    except Exception as e:
-        BROWSER.close()
-        raise e
-
-    BROWSER.close()
+        asyncio.run(
+            collect_projects(
+                outpath, use_api=use_api, concurrency=concurrency, sync=sync
+            )
+        )
+    finally:
+        BROWSER_POOL.close()
+    http_client.print_metrics()
 
 
 if __name__ == "__main__":
@@ -254,6 +481,65 @@ if __name__ == "__main__":
         type=str,
         help="Path",
     )
+    parser.add_argument(
+        "--api",
+        action="store_true",
+        help="Collect the measures from the SonarCloud API instead of "
+        + "scraping the activity pages.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of projects that are collected at the same time.",
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        default=1.0,
+        help="Maximum number of requests per second to sonarcloud.io.",
+    )
+    parser.add_argument(
+        "--browsers",
+        type=int,
+        default=2,
+        help="Number of headless browsers for scraping the activity pages.",
+    )
+    parser.add_argument(
+        "--recycle-after",
+        type=int,
+        default=100,
+        help="Restart a browser after it loaded this many pages.",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Append only analyses that are newer than the ones in existing "
+        + "project files.",
+    )
+    parser.add_argument(
+        "--extractor",
+        choices=list(EXTRACTORS.keys()),
+        default="fast",
+        help="Backend for extracting the values from the scraped pages.",
+    )
+    parser.add_argument(
+        "--save-pages",
+        metavar="DIR",
+        default=None,
+        help="Store the source of every scraped page in this directory, "
+        + "e.g., for `bench_tooltip_extract.py`.",
+    )
 
     args = parser.parse_args()
-    main(args.outpath)
+    main(
+        args.outpath,
+        use_api=args.api,
+        concurrency=args.concurrency,
+        rps=args.rps,
+        no_browsers=args.browsers,
+        recycle_after=args.recycle_after,
+        sync=args.sync,
+        extractor=args.extractor,
+        page_source_dir=args.save_pages,
+    )
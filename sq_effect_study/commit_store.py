@@ -0,0 +1,187 @@
+"""A SQLite store of the commit metadata of the mined repositories.
+
+The history of every repository is read once into the `commits` table,
+with the hash, the author and committer dates, the author, the message,
+the parents, and the inserted and deleted lines and changed files. The
+analyses then query commits by date ranges and message patterns instead of
+walking the history again.
+
+Partial clones, see `git_mining.CLONE_STRATEGIES`, lack the contents that
+the sizes of the changes are computed from and would fetch them commit by
+commit. Their commits are stored without sizes.
+
+The store remembers the head commit up to which each repository was read.
+`update_project` adds only the commits after it, or rereads the history
+of a repository that was rewritten.
+"""
+import os
+import re
+import sqlite3
+import pandas as pd
+from sq_effect_study.git_mining import (
+    get_head,
+    get_project_name,
+    is_ancestor,
+    is_partial_clone,
+    iter_commit_stats,
+)
+
+
+COMMIT_STORE_FNAME = os.path.join(
+    os.path.expanduser("~"), "case_systems", "commits.sqlite"
+)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commits (
+    project TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    -- Dates with the timezone of the author or committer
+    author_date TEXT NOT NULL,
+    committer_date TEXT NOT NULL,
+    -- Seconds since the epoch for range queries
+    author_ts INTEGER NOT NULL,
+    committer_ts INTEGER NOT NULL,
+    author_name TEXT,
+    author_email TEXT,
+    msg TEXT,
+    -- Hashes separated by spaces
+    parents TEXT,
+    insertions INTEGER,
+    deletions INTEGER,
+    files_changed INTEGER,
+    -- The order of the commits in the history from the oldest
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (project, hash)
+);
+CREATE INDEX IF NOT EXISTS commits_author_ts ON commits (project, author_ts);
+CREATE TABLE IF NOT EXISTS heads (
+    project TEXT PRIMARY KEY,
+    head TEXT NOT NULL
+);
+"""
+COMMIT_COLUMNS = (
+    "project",
+    "hash",
+    "author_date",
+    "committer_date",
+    "author_ts",
+    "committer_ts",
+    "author_name",
+    "author_email",
+    "msg",
+    "parents",
+    "insertions",
+    "deletions",
+    "files_changed",
+    "seq",
+)
+
+
+def regexp(pattern, value):
+    return value is not None and re.search(pattern, value) is not None
+
+
+def connect(fname=COMMIT_STORE_FNAME):
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    conn = sqlite3.connect(fname)
+    conn.executescript(SCHEMA)
+    # Makes `msg REGEXP ?` available to the queries
+    conn.create_function("REGEXP", 2, regexp, deterministic=True)
+    return conn
+
+
+def update_project(conn, repo_path, project=None):
+    """Reads the commits of the repository that are not in the store yet.
+    Returns the number of added commits.
+    """
+    project = project or get_project_name(repo_path)
+    head = get_head(repo_path)
+    row = conn.execute(
+        "SELECT head FROM heads WHERE project = ?", (project,)
+    ).fetchone()
+    if row and row[0] == head:
+        return 0
+
+    rev = "HEAD"
+    if row and is_ancestor(repo_path, row[0], head):
+        rev = f"{row[0]}..{head}"
+    elif row:
+        print(f"The history of {project} was rewritten, rereading it...")
+    if rev == "HEAD":
+        conn.execute("DELETE FROM commits WHERE project = ?", (project,))
+    numstat = not is_partial_clone(repo_path)
+    if not numstat:
+        print(
+            f"Warning: {project} is a partial clone, its commits are stored "
+            + "without the sizes of their changes"
+        )
+    (seq,) = conn.execute(
+        "SELECT COALESCE(MAX(seq), -1) FROM commits WHERE project = ?",
+        (project,),
+    ).fetchone()
+
+    rows = (
+        (
+            project,
+            c.hash,
+            c.author_date.isoformat(),
+            c.committer_date.isoformat(),
+            int(c.author_date.timestamp()),
+            int(c.committer_date.timestamp()),
+            c.author_name,
+            c.author_email,
+            c.msg,
+            " ".join(c.parents),
+            c.insertions,
+            c.deletions,
+            c.files_changed,
+            seq + idx,
+        )
+        for idx, c in enumerate(
+            iter_commit_stats(repo_path, rev, numstat=numstat), start=1
+        )
+    )
+    placeholders = ", ".join("?" for _ in COMMIT_COLUMNS)
+    with conn:
+        cursor = conn.executemany(
+            f"INSERT OR REPLACE INTO commits VALUES ({placeholders})", rows
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO heads VALUES (?, ?)", (project, head)
+        )
+    return cursor.rowcount
+
+
+def query_commits(conn, project, since=None, until=None, msg_pattern=None):
+    """Returns the commits of the project in the order of its history,
+    optionally only those authored in `[since, until)` and those whose
+    message matches the regular expression `msg_pattern`.
+    """
+    clauses = ["project = ?"]
+    params = [project]
+    if since is not None:
+        clauses.append("author_ts >= ?")
+        params.append(pd.Timestamp(since).timestamp())
+    if until is not None:
+        clauses.append("author_ts < ?")
+        params.append(pd.Timestamp(until).timestamp())
+    if msg_pattern is not None:
+        clauses.append("msg REGEXP ?")
+        params.append(msg_pattern)
+
+    query = (
+        "SELECT * FROM commits WHERE "
+        + " AND ".join(clauses)
+        + " ORDER BY seq"
+    )
+    df = pd.read_sql_query(query, conn, params=params)
+    # Like the dates of the mined commits, in the timezone of the author
+    df.author_date = df.author_date.map(pd.Timestamp)
+    df.committer_date = df.committer_date.map(pd.Timestamp)
+    return df
+
+
+def open_store(repo_path, fname=COMMIT_STORE_FNAME):
+    """Connects to the store and brings the repository up to date."""
+    conn = connect(fname)
+    update_project(conn, repo_path)
+    return conn
@@ -60,3 +60,33 @@ PROJECTS_BUGZILLA = {
 PROJECTS_GH_ISSUES = {
     "dolphinscheduler": "dolphinscheduler",
 }
+
+# How the commit messages of a project reference JIRA issues, `{jira_id}` is
+# replaced with the project's key from `PROJECTS_JIRA` and the group `key`
+# matches the referenced issue
+ISSUE_REFERENCE_PATTERNS = {
+    # Daffodil puts ticket references in the end of the message, if at all
+    "daffodil": r"(?P<key>{jira_id}-\d+)$",
+    "hadoop-ozone": r"(?P<key>{jira_id}-\d+)\. ",
+    "ratis": r"(?P<key>{jira_id}-\d+)\. ",
+    "groovy": r"(?P<key>{jira_id}-\d+)[:,]",
+    "karaf": r"\[(?P<key>{jira_id}-\d+)\]",
+}
+DEFAULT_ISSUE_REFERENCE_PATTERN = r"\b(?P<key>{jira_id}-\d+)\b"
+
+# Labels of commit messages and issue descriptions and the patterns that
+# mark them, see `text_labels.py`
+LABEL_PATTERNS = {
+    "sonar": r"[Ss]onar",
+    "findbugs": r"[Ff]ind[Bb]ugs",
+    "spotbugs": r"[Ss]pot[Bb]ugs",
+    "checkstyle": r"[Cc]heck[Ss]tyle",
+    "pmd": r"\bPMD\b",
+    "code_smell": r"[Ss]mell",
+    # Only the keys of the tracked projects, as other text looks like keys,
+    # too, e.g., `UTF-8` or `SHA-256`
+    "jira_key": r"\b(?:"
+    + "|".join(sorted(filter(None, PROJECTS_JIRA.values())))
+    + r")-\d+\b",
+    "gh_reference": r"#\d+\b",
+}
@@ -0,0 +1,133 @@
+"""A cache for the DataFrames that the analyses load from the input data.
+
+Loading the SonarCloud histories, the commits, or the issue dumps means
+reading large CSV files and parsing their dates, which the analyses, the
+scripts, and the notebooks do again and again. The loaders pass the files
+they read and a function that loads them to `load`, which keeps the parsed
+DataFrames in memory and pickled on disk.
+
+Entries are keyed by the name of the loader and the paths, sizes, and
+modification times of its files, so that changed input files are loaded
+again. The least recently used entries are evicted from memory when there
+are more than the maximum number of entries and from disk when the cache
+grows beyond its maximum size.
+
+The cache is configured with the environment variables:
+
+- `SQ_EFFECT_DATASET_CACHE_DIR`: location of the cache on disk
+- `SQ_EFFECT_DATASET_CACHE_ENTRIES`: maximum number of DataFrames in memory
+- `SQ_EFFECT_DATASET_CACHE_MAX_SIZE`: maximum size of the cache on disk in
+  bytes, `0` disables the cache on disk
+"""
+import os
+import pickle
+import hashlib
+import pandas as pd
+from collections import OrderedDict
+
+
+CACHE_DIR = os.getenv(
+    "SQ_EFFECT_DATASET_CACHE_DIR",
+    os.path.join(
+        os.path.expanduser("~"), ".cache", "sq_effect_study", "datasets"
+    ),
+)
+DEFAULT_MAX_ENTRIES = int(os.getenv("SQ_EFFECT_DATASET_CACHE_ENTRIES", 32))
+DEFAULT_MAX_SIZE = int(
+    os.getenv("SQ_EFFECT_DATASET_CACHE_MAX_SIZE", 1024**3)
+)
+
+
+class DatasetCache:
+    def __init__(
+        self,
+        path=CACHE_DIR,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        max_size=DEFAULT_MAX_SIZE,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get_key(self, name, fnames):
+        parts = [name]
+        for fname in fnames:
+            # Raises like `pd.read_csv` for missing files
+            stat = os.stat(fname)
+            parts.append(
+                f"{os.path.abspath(fname)}:{stat.st_size}:{stat.st_mtime_ns}"
+            )
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def get(self, name, fnames, load):
+        """Returns the DataFrame that `load` returns for the files `fnames`
+        from the cache if none of the files changed since, otherwise `load`
+        is called and its result is cached.
+        """
+        key = self.get_key(name, fnames)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            df = self._entries[key]
+        else:
+            df = self._load_entry(key)
+            if df is None:
+                df = load()
+                if self.max_size:
+                    self._store(key, df)
+            self._remember(key, df)
+        # The callers may modify the DataFrames that they get
+        return df.copy()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.pkl")
+
+    def _remember(self, key, df):
+        self._entries[key] = df
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_entry(self, key):
+        fname = self._entry_path(key)
+        try:
+            df = pd.read_pickle(fname)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # The modification time of an entry is its last access for the LRU
+        os.utime(fname)
+        return df
+
+    def _store(self, key, df):
+        # Write atomically, so that concurrent analyses never read a partial
+        # entry
+        fname = self._entry_path(key)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        tmp_fname = f"{fname}.{os.getpid()}.tmp"
+        df.to_pickle(tmp_fname)
+        os.replace(tmp_fname, fname)
+        self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries from disk until the cache
+        has shrunk to 90% of its maximum size.
+        """
+        fnames = []
+        for root, _, files in os.walk(self.path):
+            fnames += [
+                os.path.join(root, f) for f in files if f.endswith(".pkl")
+            ]
+        size = sum(os.path.getsize(f) for f in fnames)
+        if size <= self.max_size:
+            return
+        for fname in sorted(fnames, key=os.path.getmtime):
+            if size <= 0.9 * self.max_size:
+                break
+            size -= os.path.getsize(fname)
+            os.remove(fname)
+
+
+CACHE = DatasetCache()
+
+
+def load(name, fnames, loader):
+    return CACHE.get(name, fnames, loader)
@@ -0,0 +1,229 @@
+"""Mining of the commit messages of git repositories.
+
+The analyses only read the hash, the author date, and the message of every
+commit. The `git` backend streams exactly these from a single `git log`
+process with NUL separated fields, which avoids the commit objects that
+PyDriller builds and the process per commit that it needs for them. The
+`pydriller` backend is kept for comparison, see `bench_mining.py`.
+
+Both backends yield `Commit` tuples in the order of PyDriller's
+`traverse_commits`, i.e., from the oldest to the newest commit reachable
+from `HEAD`. Messages are stripped like PyDriller's `msg` and dates are
+timezone aware in the timezone of the author.
+"""
+import os
+import subprocess
+from datetime import datetime
+from collections import namedtuple
+
+
+Commit = namedtuple("Commit", ["project_name", "hash", "author_date", "msg"])
+CommitStats = namedtuple(
+    "CommitStats",
+    [
+        "hash",
+        "parents",
+        "author_name",
+        "author_email",
+        "author_date",
+        "committer_date",
+        "msg",
+        "insertions",
+        "deletions",
+        "files_changed",
+    ],
+)
+
+# Every commit is printed as hash, author date, and raw message, and `-z`
+# ends every commit with a NUL, too
+LOG_FORMAT = "%H%x00%aI%x00%B"
+FIELDS_PER_COMMIT = 3
+# The commits of `iter_commit_stats` start with a record separator and their
+# fields are separated by unit separators, followed by the lines of
+# `--numstat`. These are separated by newlines, as the log is not read with
+# `-z`, and unusual paths are quoted, so they never contain a newline.
+STATS_LOG_FORMAT = "%x1e%H%x1f%P%x1f%an%x1f%ae%x1f%aI%x1f%cI%x1f%B%x1f"
+STATS_FIELDS_PER_COMMIT = 7
+READ_SIZE = 1024 * 1024
+# Options of `git clone`. Mining messages needs only the commits, so the
+# partial clones leave out the file contents (`blobless`) or also the
+# directory trees (`treeless`) and skip the checkout.
+CLONE_STRATEGIES = {
+    "full": [],
+    "blobless": ["--filter=blob:none", "--no-checkout"],
+    "treeless": ["--filter=tree:0", "--no-checkout"],
+}
+
+
+def get_project_name(repo_path):
+    return os.path.basename(os.path.abspath(repo_path))
+
+
+def is_partial_clone(repo_path):
+    cmd = ["git", "-C", repo_path, "config", "remote.origin.promisor"]
+    r = subprocess.run(cmd, capture_output=True, text=True)
+    return r.stdout.strip() == "true"
+
+
+def clone_repo(url, clone_to, fetch=False, strategy="full"):
+    """Clones the repository into a directory named after it in `clone_to`,
+    unless it was cloned before. With `fetch`, a previous clone is updated.
+    Returns the path of the clone.
+
+    See `CLONE_STRATEGIES` for the `strategy` of new clones. Partial clones
+    are not checked out and have no working tree. They fetch missing
+    objects on demand, e.g., when a later stage asks for diffs.
+    """
+    repo_name = get_project_name(url).removesuffix(".git")
+    repo_path = os.path.join(clone_to, repo_name)
+    if not os.path.isdir(repo_path):
+        os.makedirs(clone_to, exist_ok=True)
+        cmd = ["git", "clone", "-q"] + CLONE_STRATEGIES[strategy]
+        subprocess.run(cmd + [url, repo_path], check=True)
+    elif fetch:
+        cmd = ["git", "-C", repo_path, "fetch", "-q", "origin", "HEAD"]
+        subprocess.run(cmd, check=True)
+        # Follow the upstream even if its history was rewritten. Partial
+        # clones have no working tree to update.
+        if is_partial_clone(repo_path):
+            cmd = ["update-ref", "HEAD", "FETCH_HEAD"]
+        else:
+            cmd = ["reset", "-q", "--hard", "FETCH_HEAD"]
+        subprocess.run(["git", "-C", repo_path] + cmd, check=True)
+    return repo_path
+
+
+def iter_log_output(
+    repo_path, log_format, rev="HEAD", sep=b"\0", options=()
+):
+    """Streams the output of `git log` split at `sep` without holding the
+    whole history in memory.
+    """
+    cmd = [
+        "git",
+        "-C",
+        repo_path,
+        "-c",
+        "i18n.logOutputEncoding=UTF-8",
+        "log",
+        "--reverse",
+        *options,
+        f"--format={log_format}",
+        rev,
+    ]
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE) as proc:
+        rest = b""
+        while True:
+            chunk = proc.stdout.read(READ_SIZE)
+            if not chunk:
+                break
+            parts = (rest + chunk).split(sep)
+            # The last part is incomplete until the next separator arrives
+            rest = parts.pop()
+            yield from parts
+        if rest:
+            yield rest
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+def iter_log_fields(repo_path, rev="HEAD"):
+    return iter_log_output(repo_path, LOG_FORMAT, rev, options=["-z"])
+
+
+def parse_numstat(numstat):
+    """Sums the lines of `git log --numstat` to the inserted and deleted
+    lines and the changed files of a commit. Binary files count as changed
+    files without lines.
+    """
+    insertions = deletions = files_changed = 0
+    for line in numstat.splitlines():
+        if not line.strip():
+            continue
+        added, deleted, _ = line.split("\t", 2)
+        files_changed += 1
+        if added != "-":
+            insertions += int(added)
+            deletions += int(deleted)
+    return insertions, deletions, files_changed
+
+
+def iter_commit_stats(repo_path, rev="HEAD", numstat=True):
+    """Yields the metadata and the size of the changes of every commit as
+    `CommitStats`. Merge commits have no changes, like in `git log`. Without
+    `numstat`, the sizes are `None`. Partial clones would fetch the contents
+    that the diffs need on demand, commit by commit.
+    """
+    options = ["--numstat"] if numstat else []
+    records = iter_log_output(
+        repo_path, STATS_LOG_FORMAT, rev, sep=b"\x1e", options=options
+    )
+    for record in records:
+        if not record:
+            continue
+        text = record.decode("utf-8", errors="replace")
+        *fields, numstat_lines = text.split("\x1f", STATS_FIELDS_PER_COMMIT)
+        hash_val, parents, author, email, author_date, committer_date, msg = (
+            fields
+        )
+        if numstat:
+            stats = parse_numstat(numstat_lines)
+        else:
+            stats = (None, None, None)
+        yield CommitStats(
+            hash_val,
+            parents.split(),
+            author,
+            email,
+            datetime.fromisoformat(author_date),
+            datetime.fromisoformat(committer_date),
+            msg.strip(),
+            *stats,
+        )
+
+
+def get_head(repo_path):
+    cmd = ["git", "-C", repo_path, "rev-parse", "HEAD"]
+    r = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return r.stdout.strip()
+
+
+def is_ancestor(repo_path, commit, rev="HEAD"):
+    """Tells if `commit` is still in the history of `rev`, which is not
+    the case anymore after the history was rewritten, e.g., by a force push.
+    """
+    cmd = ["git", "-C", repo_path, "merge-base", "--is-ancestor", commit, rev]
+    # Fails with 128 for commits that do not exist anymore
+    return subprocess.run(cmd, capture_output=True).returncode == 0
+
+
+def iter_commits_git(repo_path, rev="HEAD"):
+    """`rev` can be a range, e.g., `<last>..HEAD` for the new commits."""
+    project_name = get_project_name(repo_path)
+    fields = iter_log_fields(repo_path, rev)
+    for hash_val, author_date, msg in zip(*[fields] * FIELDS_PER_COMMIT):
+        yield Commit(
+            project_name,
+            hash_val.decode(),
+            datetime.fromisoformat(author_date.decode()),
+            msg.decode("utf-8", errors="replace").strip(),
+        )
+
+
+def iter_commits_pydriller(repo_path):
+    from pydriller import Repository
+
+    for commit in Repository(path_to_repo=repo_path).traverse_commits():
+        yield Commit(
+            commit.project_name, commit.hash, commit.author_date, commit.msg
+        )
+
+
+BACKENDS = {
+    "git": iter_commits_git,
+    "pydriller": iter_commits_pydriller,
+}
+
+
+def iter_commits(repo_path, backend="git", **kwargs):
+    return BACKENDS[backend](repo_path, **kwargs)
@@ -0,0 +1,64 @@
+"""Queries to the GraphQL API of GitHub.
+
+One GraphQL query can ask for the data of several repositories at once by
+giving each repository an alias. GitHub charges such a query by the number
+of nodes it may return and not per repository, so batching saves most of
+the rate limit points that one REST request per repository and page costs.
+"""
+import threading
+from os import getenv
+from collections import Counter
+from sq_effect_study import http_client
+
+
+GH_GRAPHQL_URL = getenv("GH_GRAPHQL_URL", "https://api.github.com/graphql")
+# Appended to queries to learn what they cost
+RATE_LIMIT_FIELDS = "rateLimit { cost remaining resetAt }"
+
+_COST = Counter()
+_COST_LOCK = threading.Lock()
+
+
+class GraphQLError(Exception):
+    pass
+
+
+def query(text, variables=None):
+    """Sends the query and returns its `data`. Errors of single aliases,
+    e.g., a repository that does not exist, leave the other aliases intact
+    and are only printed.
+    """
+    headers = {"Authorization": f"bearer {getenv('GITHUB_API_KEY')}"}
+    r = http_client.post(
+        GH_GRAPHQL_URL,
+        json={"query": text, "variables": variables or {}},
+        headers=headers,
+    )
+    r.raise_for_status()
+    body = r.json()
+    data = body.get("data")
+    if not data:
+        raise GraphQLError(body.get("errors"))
+    for error in body.get("errors", []):
+        print(f"GraphQL error: {error.get('message')}")
+
+    with _COST_LOCK:
+        _COST["queries"] += 1
+        if data.get("rateLimit"):
+            _COST["points"] += data["rateLimit"]["cost"]
+    return data
+
+
+def get_cost():
+    """Returns the number of queries and the rate limit points they cost."""
+    with _COST_LOCK:
+        return dict(_COST)
+
+
+def print_cost():
+    cost = get_cost()
+    if cost:
+        print(
+            f"{cost['queries']} GraphQL queries cost "
+            + f"{cost.get('points', 0)} rate limit points"
+        )
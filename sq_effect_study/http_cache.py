@@ -0,0 +1,251 @@
+"""An on-disk cache for the HTTP responses of all collectors.
+
+Re-running a collector, e.g., after fixing a bug in the parsing of the
+collected data, replays the responses from disk instead of downloading
+everything again from SonarCloud, JIRA, Bugzilla, or GitHub.
+
+Entries are keyed by a hash over the URL and the query parameters. The
+response bodies are stored zstd-compressed under the hash of their content,
+so that identical responses are stored only once. Entries expire after a
+TTL. Expired entries are revalidated with a conditional request when the
+server sent an `ETag` or `Last-Modified` header. When the cache grows
+beyond its maximum size, the least recently used entries are evicted.
+
+The cache is configured with the environment variables:
+
+- `SQ_EFFECT_CACHE_DIR`: location of the cache
+- `SQ_EFFECT_CACHE_TTL`: seconds after which entries expire, `0` disables
+  the cache
+- `SQ_EFFECT_CACHE_MAX_SIZE`: maximum size of the cache in bytes
+"""
+import os
+import json
+import hashlib
+import threading
+import zstandard
+from time import time
+from collections import Counter
+from urllib.parse import urlencode
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from sq_effect_study import http_client, replay
+
+
+CACHE_DIR = os.getenv(
+    "SQ_EFFECT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "sq_effect_study", "http"),
+)
+DEFAULT_TTL = int(os.getenv("SQ_EFFECT_CACHE_TTL", 24 * 60 * 60))
+DEFAULT_MAX_SIZE = int(os.getenv("SQ_EFFECT_CACHE_MAX_SIZE", 2 * 1024**3))
+# Responses with other status codes are never cached
+CACHED_STATUS_CODES = (200, 404)
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class CachedResponse:
+    """Mimics the parts of `requests.Response` that the collectors use."""
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+    @property
+    def text(self):
+        encoding = get_encoding_from_headers(self.headers) or "utf-8"
+        return self.content.decode(encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ResponseCache:
+    def __init__(
+        self, path=CACHE_DIR, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._size = None
+        self._lock = threading.Lock()
+
+    def get_key(self, url, params=None):
+        if params:
+            url += "?" + urlencode(sorted(params.items()))
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, url, params=None, ttl=None, **kwargs):
+        """Returns the response for the GET request from the cache if it is
+        fresh, otherwise the response is requested and cached.
+        """
+        response = self._get(url, params, ttl, **kwargs)
+        if params:
+            url += "?" + urlencode(params)
+        replay.record(url, response)
+        return response
+
+    def _get(self, url, params=None, ttl=None, **kwargs):
+        if ttl is None:
+            ttl = self.ttl
+        key = self.get_key(url, params)
+        entry = self._load_entry(key)
+        if entry and ttl and (time() - entry["stored_at"] < ttl):
+            response = self._hit(key, entry)
+            if response:
+                return response
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry:
+            # Revalidate the stale entry if the server supports it
+            validators = {}
+            if entry["headers"].get("ETag"):
+                validators["If-None-Match"] = entry["headers"]["ETag"]
+            if entry["headers"].get("Last-Modified"):
+                last_modified = entry["headers"]["Last-Modified"]
+                validators["If-Modified-Since"] = last_modified
+            r = self._request(url, params, {**headers, **validators}, kwargs)
+            if r.status_code == 304:
+                entry["stored_at"] = time()
+                self._write_entry(key, entry)
+                response = self._hit(key, entry)
+                if response:
+                    return response
+                r = self._request(url, params, headers, kwargs)
+        else:
+            r = self._request(url, params, headers, kwargs)
+
+        response = CachedResponse(
+            r.url, r.status_code, dict(r.headers), r.content
+        )
+        if self.ttl and r.status_code in CACHED_STATUS_CODES:
+            self._store(key, response)
+        return response
+
+    def _request(self, url, params, headers, kwargs):
+        return http_client.get(url, params=params, headers=headers, **kwargs)
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, "entries", key[:2], f"{key}.json")
+
+    def _blob_path(self, content_hash):
+        return os.path.join(
+            self.path, "blobs", content_hash[:2], f"{content_hash}.zst"
+        )
+
+    def _load_entry(self, key):
+        try:
+            with open(self._entry_path(key)) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_entry(self, key, entry):
+        self._write_file(self._entry_path(key), json.dumps(entry).encode())
+
+    def _write_file(self, fname, content):
+        # Write atomically, as several threads may write the same entry
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        tmp_fname = f"{fname}.{threading.get_ident()}.tmp"
+        with open(tmp_fname, "wb") as fp:
+            fp.write(content)
+        os.replace(tmp_fname, fname)
+
+    def _hit(self, key, entry):
+        try:
+            with open(self._blob_path(entry["content_hash"]), "rb") as fp:
+                content = zstandard.ZstdDecompressor().decompress(fp.read())
+        except FileNotFoundError:
+            # The blob was evicted concurrently
+            return None
+        # The modification time of an entry is its last access for the LRU
+        os.utime(self._entry_path(key))
+        return CachedResponse(
+            entry["url"], entry["status_code"], entry["headers"], content
+        )
+
+    def _store(self, key, response):
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        blob_fname = self._blob_path(content_hash)
+        new_blob_size = 0
+        if not os.path.isfile(blob_fname):
+            compressed = zstandard.ZstdCompressor().compress(response.content)
+            self._write_file(blob_fname, compressed)
+            new_blob_size = len(compressed)
+
+        entry = {
+            "url": response.url,
+            "status_code": response.status_code,
+            "headers": {
+                h: response.headers[h]
+                for h in STORED_HEADERS
+                if h in response.headers
+            },
+            "content_hash": content_hash,
+            "stored_at": time(),
+        }
+        self._write_entry(key, entry)
+        if new_blob_size:
+            # Only evict once the new blob is referenced by its entry
+            self._add_size(new_blob_size)
+
+    def _list_files(self, kind):
+        suffix = ".zst" if kind == "blobs" else ".json"
+        fnames = []
+        for root, _, files in os.walk(os.path.join(self.path, kind)):
+            fnames += [
+                os.path.join(root, f) for f in files if f.endswith(suffix)
+            ]
+        return fnames
+
+    def _add_size(self, no_bytes):
+        with self._lock:
+            if self._size is None:
+                # The new blob is already written and thus counted
+                self._size = sum(
+                    os.path.getsize(f) for f in self._list_files("blobs")
+                )
+            else:
+                self._size += no_bytes
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache has
+        shrunk to 90% of its maximum size and then all blobs that are not
+        referenced by an entry anymore.
+        """
+        entry_fnames = sorted(
+            self._list_files("entries"), key=os.path.getmtime
+        )
+        entries = {}
+        for fname in entry_fnames:
+            with open(fname) as fp:
+                entries[fname] = json.load(fp)["content_hash"]
+        references = Counter(entries.values())
+        blob_sizes = {
+            os.path.basename(f)[: -len(".zst")]: os.path.getsize(f)
+            for f in self._list_files("blobs")
+        }
+
+        size = sum(blob_sizes.values())
+        for fname in entry_fnames:
+            if size <= 0.9 * self.max_size:
+                break
+            os.remove(fname)
+            content_hash = entries[fname]
+            references[content_hash] -= 1
+            if not references[content_hash]:
+                size -= blob_sizes.get(content_hash, 0)
+
+        for content_hash in blob_sizes.keys():
+            if not references[content_hash]:
+                os.remove(self._blob_path(content_hash))
+        self._size = size
+
+
+CACHE = ResponseCache()
+
+
+def get(url, params=None, ttl=None, **kwargs):
+    return CACHE.get(url, params=params, ttl=ttl, **kwargs)
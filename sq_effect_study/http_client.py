@@ -0,0 +1,165 @@
+"""The HTTP client that is shared by all collectors.
+
+Requests to a host reuse the connections of one `requests.Session` per
+host, which saves a TCP and TLS handshake per request. Responses are
+requested compressed with all encodings that urllib3 can decode, i.e.,
+gzip and deflate, and Brotli when the `brotli` package is installed.
+
+Connection errors, rate limit responses, and transient server errors are
+retried with jittered exponential backoff. A `Retry-After` header of the
+server takes precedence and pauses the rate limiter of the host, so that
+all concurrent workers back off together instead of only the one that was
+answered.
+
+Per host, the client counts the requests, the bytes received over the
+wire, the retries, and the seconds spent waiting for the rate limiter or
+a backoff. `print_metrics` reports them at the end of a collection run.
+"""
+import random
+import threading
+import requests
+from time import sleep
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from tabulate import tabulate
+from urllib3.util import make_headers
+from requests.adapters import HTTPAdapter
+from sq_effect_study import rate_limit, replay
+
+
+# Connections that are kept open per host. The collectors never have more
+# requests in flight to a host than this.
+POOL_SIZE = 16
+# Seconds to connect and to wait for data, e.g., while Bugzilla assembles a
+# large CSV export
+TIMEOUT = (10, 600)
+MAX_RETRIES = 6
+# Seconds of the first backoff, which doubles with every retry
+BACKOFF_BASE = 1
+BACKOFF_MAX = 120
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+METRICS = ("requests", "bytes", "retries", "wait [s]")
+
+_SESSIONS = {}
+_METRICS = {}
+_LOCK = threading.Lock()
+
+
+def get_session(url):
+    host = rate_limit.get_host(url)
+    with _LOCK:
+        if host not in _SESSIONS:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            _SESSIONS[host] = session
+        return _SESSIONS[host]
+
+
+def count(url, **values):
+    host = rate_limit.get_host(url)
+    with _LOCK:
+        _METRICS.setdefault(host, Counter()).update(values)
+
+
+def get_metrics():
+    with _LOCK:
+        return {host: dict(metrics) for host, metrics in _METRICS.items()}
+
+
+def print_metrics():
+    rows = [
+        [host] + [metrics.get(m, 0) for m in METRICS]
+        for host, metrics in sorted(get_metrics().items())
+    ]
+    if rows:
+        print(tabulate(rows, headers=["host"] + list(METRICS), floatfmt=".1f"))
+
+
+def get_retry_after(response):
+    """Returns the seconds to wait according to the `Retry-After` header of
+    the response, which is either a number of seconds or an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.now(timezone.utc)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+def get_backoff(attempt):
+    """Full jitter: a random time up to the exponentially growing limit."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def get_wire_size(response):
+    try:
+        # Bytes read from the socket, i.e., before decompression
+        return response.raw.tell()
+    except AttributeError:
+        return len(response.content)
+
+
+def request(method, url, max_retries=MAX_RETRIES, **kwargs):
+    """Sends a request under the rate limit of its host and retries it on
+    connection errors and transient errors of the server. The response of
+    the last attempt is returned, even if it still has an error status.
+    """
+    session = get_session(url)
+    kwargs.setdefault("timeout", TIMEOUT)
+    for attempt in range(max_retries + 1):
+        wait_time = rate_limit.wait(url)
+        try:
+            r = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            backoff = get_backoff(attempt)
+            print(f"Retrying {url} in {backoff:.1f}s after: {e}")
+            count(url, retries=1, **{"wait [s]": wait_time + backoff})
+            sleep(backoff)
+            continue
+
+        count(
+            url,
+            requests=1,
+            bytes=get_wire_size(r),
+            **{"wait [s]": wait_time},
+        )
+        if r.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+            return r
+
+        retry_after = get_retry_after(r)
+        count(url, retries=1)
+        if retry_after is not None:
+            print(f"Retrying {url} in {retry_after:.1f}s ({r.status_code})")
+            # The next `rate_limit.wait` of every worker waits for it
+            rate_limit.get_limiter(url).pause(retry_after)
+        else:
+            backoff = get_backoff(attempt)
+            print(f"Retrying {url} in {backoff:.1f}s ({r.status_code})")
+            count(url, **{"wait [s]": backoff})
+            sleep(backoff)
+
+
+def get(url, params=None, headers=None, **kwargs):
+    return request("GET", url, params=params, headers=headers, **kwargs)
+
+
+def post(url, json=None, headers=None, **kwargs):
+    r = request("POST", url, json=json, headers=headers, **kwargs)
+    # GET requests are recorded by `http_cache`, POST requests are not cached
+    replay.record(url, r, method="POST", body=r.request.body)
+    return r
@@ -0,0 +1,93 @@
+"""An index from JIRA issue keys to the commits that reference them.
+
+The commit messages of every repository are read once from the commit
+store, see `commit_store.py`, and scanned for all issue references,
+following the conventions of the project in
+`config.ISSUE_REFERENCE_PATTERNS`. The index is stored as
+`<project>_issue_commits.csv` beside the clones of the repositories,
+together with the head commit it was built from, so that looking up the
+commits of an issue is a dictionary lookup.
+"""
+import os
+import re
+import pandas as pd
+from contextlib import closing
+from sq_effect_study.commit_store import open_store, query_commits
+from sq_effect_study.git_mining import get_head
+from sq_effect_study.json_state import load_state, save_state
+from sq_effect_study.config import (
+    PROJECTS_JIRA,
+    ISSUE_REFERENCE_PATTERNS,
+    DEFAULT_ISSUE_REFERENCE_PATTERN,
+)
+
+
+INDEX_COLUMNS = ["project", "iss_key", "c_hash", "date", "msg"]
+# Derived from the clones, so kept with them and not with the input data
+ISSUE_INDEX_PATH = os.path.join(os.path.expanduser("~"), "case_systems")
+# Stores the head commit from which the index of every project was built
+INDEX_STATE_FNAME = "issue_commit_index.json"
+
+
+def get_reference_pattern(proj_gh_name):
+    pattern = ISSUE_REFERENCE_PATTERNS.get(
+        proj_gh_name, DEFAULT_ISSUE_REFERENCE_PATTERN
+    )
+    jira_id = re.escape(PROJECTS_JIRA[proj_gh_name])
+    return re.compile(pattern.replace("{jira_id}", jira_id))
+
+
+def get_index_fname(path, proj_gh_name):
+    return os.path.join(path, f"{proj_gh_name}_issue_commits.csv")
+
+
+def build_issue_commit_index(proj_gh_name, repo_path):
+    """Returns a row per issue key and commit that references it, in the
+    order of the commits.
+    """
+    pattern = get_reference_pattern(proj_gh_name)
+    with closing(open_store(repo_path)) as conn:
+        cdf = query_commits(conn, proj_gh_name)
+    rows = []
+    for commit in cdf.itertuples(index=False):
+        # A commit may reference an issue several times
+        keys = {m.group("key"): None for m in pattern.finditer(commit.msg)}
+        for key in keys:
+            rows.append(
+                (
+                    proj_gh_name,
+                    key,
+                    commit.hash,
+                    commit.author_date,
+                    commit.msg,
+                )
+            )
+    return pd.DataFrame(rows, columns=INDEX_COLUMNS)
+
+
+def load_index_state(path):
+    return load_state(os.path.join(path, INDEX_STATE_FNAME))
+
+
+def save_index_state(path, state):
+    save_state(os.path.join(path, INDEX_STATE_FNAME), state)
+
+
+def load_issue_commit_index(proj_gh_name, repo_path, path=ISSUE_INDEX_PATH):
+    """Returns a dictionary from issue keys to data frames of the commits
+    that reference them. The stored index is rebuilt when the repository
+    has new commits.
+    """
+    fname = get_index_fname(path, proj_gh_name)
+    state = load_index_state(path)
+    head = get_head(repo_path)
+    if os.path.isfile(fname) and state.get(proj_gh_name) == head:
+        df = pd.read_csv(fname)
+        df.date = pd.to_datetime(df.date, utc=True)
+    else:
+        print(f"Indexing the issue references of {proj_gh_name}...")
+        df = build_issue_commit_index(proj_gh_name, repo_path)
+        df.to_csv(fname, index=False)
+        state[proj_gh_name] = head
+        save_index_state(path, state)
+    return {key: key_df for key, key_df in df.groupby("iss_key", sort=False)}
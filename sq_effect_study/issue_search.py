@@ -0,0 +1,223 @@
+"""A full-text index over the dumped issues of all projects.
+
+The dumps from JIRA, GitHub, and Bugzilla are ingested into an SQLite FTS5
+table with the key, summary, description, labels, status, and creation
+date of every issue. Only dumps that changed since the last ingestion are
+read again. Queries use the FTS5 syntax, e.g., `sonar*` or
+`"code smell" OR findbugs`, and return the matching issues of all projects
+ranked by relevance:
+
+```
+python sq_effect_study/issue_search.py data/input 'sonar*' --status Resolved
+```
+
+The index is kept outside of the input data, by default in
+`~/.cache/sq_effect_study/issue_index.sqlite`. Set
+`SQ_EFFECT_ISSUE_INDEX` or pass `--index-path` to keep it elsewhere.
+
+Text search is word based, so it approximates the regular expressions of
+the analyses, e.g., `sonar*` finds `SonarCloud` but not `ApacheSonar`.
+"""
+import os
+import sqlite3
+import argparse
+import pandas as pd
+from sq_effect_study.jira_query import get_jira_dump_fname
+from sq_effect_study.config import (
+    PROJECTS_JIRA,
+    PROJECTS_BUGZILLA,
+    PROJECTS_GH_ISSUES,
+)
+
+
+INDEX_FNAME = os.getenv(
+    "SQ_EFFECT_ISSUE_INDEX",
+    os.path.join(
+        os.path.expanduser("~"),
+        ".cache",
+        "sq_effect_study",
+        "issue_index.sqlite",
+    ),
+)
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS issues USING fts5(
+    project UNINDEXED,
+    key,
+    summary,
+    description,
+    labels,
+    status UNINDEXED,
+    -- In UTC, so that the dates compare as text
+    created UNINDEXED
+);
+CREATE TABLE IF NOT EXISTS dumps (
+    fname TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+"""
+ISSUE_COLUMNS = [
+    "project",
+    "key",
+    "summary",
+    "description",
+    "labels",
+    "status",
+    "created",
+]
+# The columns of the Bugzilla exports that correspond to `ISSUE_COLUMNS`
+BUGZILLA_COLUMNS = {
+    "Bug ID": "key",
+    "Summary": "summary",
+    "Keywords": "labels",
+    "Status": "status",
+    "Opened": "created",
+}
+
+
+def get_dump_fnames(inpath):
+    """Returns the dumps of all projects with the kind of their tracker."""
+    dumps = []
+    for project in PROJECTS_JIRA.keys():
+        dumps.append((project, "jira", get_jira_dump_fname(inpath, project)))
+    for project in PROJECTS_GH_ISSUES.keys():
+        fname = os.path.join(inpath, f"{project}_gh_issues.csv")
+        dumps.append((project, "gh_issues", fname))
+    for project in PROJECTS_BUGZILLA.keys():
+        fname = os.path.join(inpath, f"{project}_bugzilla.csv")
+        dumps.append((project, "bugzilla", fname))
+    return [dump for dump in dumps if os.path.isfile(dump[2])]
+
+
+def read_dump(project, kind, fname):
+    df = pd.read_csv(fname, dtype=str)
+    if kind == "bugzilla":
+        df = df.rename(columns=BUGZILLA_COLUMNS)
+    df["project"] = project
+    # Dumps from before the summaries were collected have none
+    for column in ISSUE_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    df.created = pd.to_datetime(df.created, utc=True).dt.strftime(
+        "%Y-%m-%dT%H:%M:%S"
+    )
+    return df[ISSUE_COLUMNS]
+
+
+def connect(index_fname=INDEX_FNAME):
+    os.makedirs(os.path.dirname(os.path.abspath(index_fname)), exist_ok=True)
+    conn = sqlite3.connect(index_fname)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def update_index(conn, inpath):
+    """Ingests the dumps that are new or that changed since they were
+    ingested. Returns the number of ingested dumps.
+    """
+    no_ingested = 0
+    for project, kind, fname in get_dump_fnames(inpath):
+        # The index is shared by all input paths
+        fname = os.path.abspath(fname)
+        stat = os.stat(fname)
+        row = conn.execute(
+            "SELECT size, mtime FROM dumps WHERE fname = ?", (fname,)
+        ).fetchone()
+        if row == (stat.st_size, stat.st_mtime):
+            continue
+
+        print(f"Indexing {fname}...")
+        df = read_dump(project, kind, fname)
+        with conn:
+            # Every project tracks its issues in a single tracker
+            conn.execute(
+                "DELETE FROM issues WHERE rowid IN (SELECT rowid FROM issues "
+                + "WHERE project = ?)",
+                (project,),
+            )
+            conn.executemany(
+                "INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?)",
+                df.itertuples(index=False),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO dumps VALUES (?, ?, ?, ?)",
+                (fname, project, stat.st_size, stat.st_mtime),
+            )
+        no_ingested += 1
+    return no_ingested
+
+
+def search_issues(
+    conn, query, projects=None, status=None, since=None, until=None
+):
+    """Returns the issues that match the FTS5 `query`, the best matches
+    first. The matches can be restricted to some projects, to a status, and
+    to issues created in `[since, until)`.
+    """
+    clauses = ["issues MATCH ?"]
+    params = [query]
+    if projects:
+        clauses.append(f"project IN ({', '.join('?' for _ in projects)})")
+        params += list(projects)
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if since is not None:
+        clauses.append("created >= ?")
+        params.append(pd.Timestamp(since).strftime("%Y-%m-%dT%H:%M:%S"))
+    if until is not None:
+        clauses.append("created < ?")
+        params.append(pd.Timestamp(until).strftime("%Y-%m-%dT%H:%M:%S"))
+
+    sql = (
+        "SELECT project, key, summary, status, created FROM issues WHERE "
+        + " AND ".join(clauses)
+        + " ORDER BY rank"
+    )
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+if __name__ == "__main__":
+    msg = "Search the issues of all projects."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "inpath",
+        metavar="inpath",
+        type=str,
+        help="Path to the issue dumps",
+    )
+    parser.add_argument(
+        "query",
+        metavar="query",
+        type=str,
+        help="FTS5 query, e.g., 'sonar*'",
+    )
+    parser.add_argument(
+        "--project",
+        action="append",
+        default=None,
+        help="Only search the issues of this project. Can be given multiple "
+        + "times.",
+    )
+    parser.add_argument(
+        "--status",
+        type=str,
+        default=None,
+        help="Only search issues with this status, e.g., Resolved.",
+    )
+    parser.add_argument(
+        "--index-path",
+        type=str,
+        default=INDEX_FNAME,
+        help=f"Path to the search index, by default {INDEX_FNAME}.",
+    )
+
+    args = parser.parse_args()
+    conn = connect(args.index_path)
+    update_index(conn, args.inpath)
+    df = search_issues(
+        conn, args.query, projects=args.project, status=args.status
+    )
+    print(df.to_string(index=False))
+    print(f"{df.shape[0]} matching issues")
@@ -0,0 +1,118 @@
+"""Plans the JIRA queries for the analyses, so that each analysis downloads
+only the issues and fields that it actually uses.
+
+The filters of an analysis are pushed into the JQL query and the columns it
+reads are translated into the `fields` parameter of the JIRA search API.
+Only exact filters are pushed down, on issue types, statuses, and creation
+dates, so they never remove issues that the analysis uses. Text filters
+like the `[Ss]onar` regular expression stay in pandas, as JIRA's word based
+text search misses matches inside of words, e.g., in `ApacheSonar`.
+"""
+import os
+import pandas as pd
+
+
+# The fields of the JIRA search API from which the columns of the dumps are
+# filled, see `collect_jira_issues.parse_jira_issue`. `id` and `key` are
+# always returned.
+COLUMN_FIELDS = {
+    "issue_type": ("issuetype",),
+    "issue_component": ("issuetype",),
+    "creator_name": ("creator",),
+    "creator_display_name": ("creator",),
+    "reporter_name": ("reporter",),
+    "reporter_display_name": ("reporter",),
+    "priority": ("priority",),
+    "description": ("description",),
+    "labels": ("labels",),
+    "created": ("created",),
+    "resolution": ("resolutiondate",),
+    "updated": ("updated",),
+    "status": ("status",),
+    "id": (),
+    "key": (),
+    "summary": ("summary",),
+}
+
+# What the analyses need from the issue trackers:
+# - `bug_frequencies` plots the bugs per week over the whole history
+#   (`analyse_issue_tracker.create_bug_freq_df`)
+# - `bug_stats` compares the bugs per week one year before and after the
+#   start of SonarCloud (`analyse_issue_tracker.compute_stats`)
+# - `sonar_issues` looks for resolved issues that mention Sonar
+#   (`ana.identify_sonar_issues`)
+ANALYSIS_NEEDS = {
+    "bug_frequencies": {
+        "issue_types": ("Bug",),
+        "columns": ("issue_type", "created"),
+    },
+    "bug_stats": {
+        "issue_types": ("Bug",),
+        "created_window": pd.DateOffset(years=1),
+        "columns": ("issue_type", "created"),
+    },
+    "sonar_issues": {
+        "statuses": ("Resolved",),
+        "columns": ("description", "status", "created", "key"),
+    },
+}
+# Bugs are counted per week, so that issues that are created a few days
+# outside of the window may still count to a week inside of it
+WINDOW_MARGIN = pd.Timedelta(days=7)
+
+
+def get_jira_dump_fname(path, project, analysis=None):
+    if analysis:
+        return os.path.join(path, f"{project}_jira_{analysis}.csv")
+    return os.path.join(path, f"{project}_jira.csv")
+
+
+def quote_values(values):
+    return ", ".join(f'"{v}"' for v in values)
+
+
+def plan_query(
+    proj_jira_id,
+    issue_types=None,
+    created_after=None,
+    created_before=None,
+    statuses=None,
+    columns=tuple(COLUMN_FIELDS.keys()),
+):
+    """Returns the JQL query and the list of fields for the search API."""
+    clauses = [f"project={proj_jira_id}"]
+    if issue_types:
+        clauses.append(f"issuetype in ({quote_values(issue_types)})")
+    if statuses:
+        clauses.append(f"status in ({quote_values(statuses)})")
+    if created_after is not None:
+        clauses.append(f'created >= "{created_after:%Y/%m/%d %H:%M}"')
+    if created_before is not None:
+        clauses.append(f'created < "{created_before:%Y/%m/%d %H:%M}"')
+    jql = " and ".join(clauses) + " order by created"
+
+    fields = sorted({f for column in columns for f in COLUMN_FIELDS[column]})
+    return jql, fields
+
+
+def plan_analysis_query(analysis, proj_jira_id, start_date=None):
+    """Plans the query for an analysis of a project. `start_date` is the
+    first use of SonarCloud by the project, see
+    `analyse_sq_history.get_start_weeks_per_proj`, which is required for
+    analyses that look at a window around it.
+    """
+    needs = ANALYSIS_NEEDS[analysis]
+    created_after = None
+    created_before = None
+    if "created_window" in needs:
+        created_after = start_date - needs["created_window"] - WINDOW_MARGIN
+        created_before = start_date + needs["created_window"] + WINDOW_MARGIN
+
+    return plan_query(
+        proj_jira_id,
+        issue_types=needs.get("issue_types"),
+        created_after=created_after,
+        created_before=created_before,
+        statuses=needs.get("statuses"),
+        columns=needs["columns"],
+    )
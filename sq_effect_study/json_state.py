@@ -0,0 +1,24 @@
+"""The state that the collectors keep between runs in small JSON files,
+e.g., the watermarks of the JIRA dumps or the mined commits of the
+repositories.
+"""
+import os
+import json
+
+
+def load_state(fname):
+    """Returns the stored state or an empty one before the first run."""
+    if not os.path.isfile(fname):
+        return {}
+    with open(fname) as fp:
+        return json.load(fp)
+
+
+def save_state(fname, state):
+    """Replaces the stored state atomically, so that an interrupted run
+    leaves the state of the previous run intact.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(fname)), exist_ok=True)
+    with open(f"{fname}.tmp", "w") as fp:
+        json.dump(state, fp, indent=2, sort_keys=True)
+    os.replace(f"{fname}.tmp", fname)
@@ -0,0 +1,110 @@
+"""Token-bucket rate limiting per host.
+
+All collectors share one bucket per host, so that requests issued by many
+concurrent workers together never exceed the configured rate for a server.
+"""
+import threading
+from os import getenv
+from time import monotonic, sleep
+from urllib.parse import urlparse
+
+
+# Requests per second and burst size for hosts that are not configured
+# explicitly. This corresponds to the fixed `sleep(2)` between requests that
+# the collectors used before.
+DEFAULT_RATE = 0.5
+DEFAULT_BURST = 1
+# Overrides the rates of all hosts, e.g., for runs against the local
+# stand-in server of `replay.py`
+OVERRIDE_RATE = getenv("SQ_EFFECT_RPS")
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = monotonic()
+        # Counts the pauses, so that waiting threads notice a pause that
+        # started while they slept
+        self._pauses = 0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._last) * self.rate
+        )
+        self._last = now
+
+    def try_acquire(self):
+        """Takes a token if one is available without waiting."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self):
+        """Blocks until a token is available and returns the time waited in
+        seconds. Tokens are reserved while holding the lock, so waiting
+        threads are served in the order in which they arrived. A pause
+        cancels the reservations of the waiting threads, which then reserve
+        a token after the pause.
+        """
+        waited = 0
+        while True:
+            with self._lock:
+                if waited and pauses == self._pauses:
+                    return waited
+                self._refill()
+                self._tokens -= 1
+                wait_time = max(0, -self._tokens / self.rate)
+                pauses = self._pauses
+            if not wait_time:
+                return waited
+            sleep(wait_time)
+            waited += wait_time
+
+    def pause(self, seconds):
+        """Withholds all tokens for the given time, e.g., when the server
+        asks clients to retry later.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = -seconds * self.rate
+            self._pauses += 1
+
+
+def get_host(url_or_host):
+    host = urlparse(url_or_host).netloc
+    if not host:
+        # Called with a plain host name
+        host = url_or_host
+    return host
+
+
+def configure(url_or_host, rate, burst=DEFAULT_BURST):
+    host = get_host(url_or_host)
+    if OVERRIDE_RATE:
+        rate = float(OVERRIDE_RATE)
+    with _LIMITERS_LOCK:
+        _LIMITERS[host] = TokenBucket(rate, burst)
+
+
+def get_limiter(url_or_host):
+    host = get_host(url_or_host)
+    with _LIMITERS_LOCK:
+        if host not in _LIMITERS:
+            rate = float(OVERRIDE_RATE or DEFAULT_RATE)
+            _LIMITERS[host] = TokenBucket(rate, DEFAULT_BURST)
+        return _LIMITERS[host]
+
+
+def wait(url):
+    """Be kind to the server of the given URL and prevent being banned."""
+    return get_limiter(url).acquire()
@@ -0,0 +1,322 @@
+"""Record the HTTP exchanges of the collectors and replay them offline.
+
+Recording is enabled by setting the environment variable
+`SQ_EFFECT_RECORD` to the path of a fixture archive. Every response that a
+collector receives through `http_cache`, and every response to a POST
+request of `http_client`, e.g., a GraphQL query, is then appended to that
+archive, e.g.:
+
+```
+SQ_EFFECT_RECORD=fixtures/jira.jsonl.gz \
+    python sq_effect_study/collect_jira_issues.py data/input
+```
+
+The recorded archives are served by a local stand-in server:
+
+```
+python sq_effect_study/replay.py fixtures/*.jsonl.gz --port 8000 --latency 0.2
+```
+
+The collectors are pointed at the stand-in via their base URLs, which keep
+the paths of the original services, e.g.,
+`SQ_API_BASE_URL=http://localhost:8000/api/project_analyses/search`,
+`JIRA_API_BASE_URL=http://localhost:8000/jira/`, or
+`BUGZILLA_BASE_URL=http://localhost:8000/bugzilla/buglist.cgi`, or
+`GH_API_BASE_URL=http://localhost:8000/` and
+`GH_GRAPHQL_URL=http://localhost:8000/graphql`. POST requests are served
+by their path and the hash of their body.
+Set `SQ_EFFECT_RPS` to lift the client-side rate limits for such runs.
+"""
+import json
+import gzip
+import base64
+import hashlib
+import random
+import argparse
+import threading
+from os import getenv
+from time import sleep
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sq_effect_study.rate_limit import TokenBucket
+
+
+RECORD_ARCHIVE = getenv("SQ_EFFECT_RECORD")
+# Rate limit and server errors are not recorded, they are simulated instead
+RECORDED_STATUS_CODES = (200, 304, 404)
+# Paged APIs whose recorded pages can be served with other page sizes:
+# (name of the offset parameter, name of the page size parameter, key of the
+# list of items in the JSON response, is the offset a page index)
+PAGING_SCHEMES = (
+    ("startAt", "maxResults", "issues", False),  # JIRA search
+    ("p", "ps", "analyses", True),  # SonarCloud project analyses
+)
+
+_RECORD_LOCK = threading.Lock()
+
+
+def get_request_path(url):
+    """The key of a recorded exchange is the path and the query of its URL.
+    The host is dropped, so that all services are served from one server.
+    """
+    parts = urlsplit(url)
+    if parts.query:
+        return f"{parts.path}?{parts.query}"
+    return parts.path
+
+
+def get_post_key(path, body):
+    """POST requests to the same path differ in their bodies, e.g., the
+    GraphQL queries, so their key includes a hash of the body.
+    """
+    if isinstance(body, str):
+        body = body.encode()
+    return f"{path}#{hashlib.sha256(body or b'').hexdigest()}"
+
+
+def record(url, response, method="GET", body=None):
+    if not RECORD_ARCHIVE or (
+        response.status_code not in RECORDED_STATUS_CODES
+    ):
+        return
+    path = get_request_path(url)
+    if method == "POST":
+        path = get_post_key(path, body)
+    exchange = {
+        "method": method,
+        "url": url,
+        "path": path,
+        "status_code": response.status_code,
+        "headers": dict(response.headers),
+        "body": base64.b64encode(response.content).decode(),
+    }
+    line = (json.dumps(exchange) + "\n").encode()
+    with _RECORD_LOCK:
+        # Appending creates a new gzip member, which readers concatenate
+        with gzip.open(RECORD_ARCHIVE, "ab") as fp:
+            fp.write(line)
+
+
+def load_archives(fnames):
+    exchanges = {}
+    for fname in fnames:
+        with gzip.open(fname, "rt") as fp:
+            for line in fp:
+                exchange = json.loads(line)
+                exchange["body"] = base64.b64decode(exchange["body"])
+                exchanges[exchange["path"]] = exchange
+    return exchanges
+
+
+def split_paging_params(path):
+    """Returns the scheme, the offset, the page size, and the path without
+    the paging parameters for requests to paged APIs.
+    """
+    parts = urlsplit(path)
+    params = parse_qsl(parts.query)
+    param_names = [name for name, _ in params]
+    for scheme in PAGING_SCHEMES:
+        offset_param, size_param, _, is_page_idx = scheme
+        if offset_param in param_names and size_param in param_names:
+            values = dict(params)
+            size = int(values[size_param])
+            offset = int(values[offset_param])
+            if is_page_idx:
+                offset = (offset - 1) * size
+            rest = [
+                (name, value)
+                for name, value in params
+                if name not in (offset_param, size_param)
+            ]
+            return scheme, offset, size, f"{parts.path}?{urlencode(rest)}"
+    return None, None, None, path
+
+
+def index_pages(exchanges):
+    """Merges the items of all recorded pages of a paged API into a list
+    per query, so that any page of that query can be served.
+    """
+    collections = {}
+    for path, exchange in exchanges.items():
+        if exchange.get("method", "GET") != "GET":
+            continue
+        scheme, offset, _, base_path = split_paging_params(path)
+        if not scheme or exchange["status_code"] != 200:
+            continue
+        body = json.loads(exchange["body"])
+        items = body.get(scheme[2])
+        if items is None:
+            continue
+        if scheme[3]:
+            total = body["paging"]["total"]
+        else:
+            total = body["total"]
+        collection = collections.setdefault(
+            base_path,
+            {"scheme": scheme, "items": {}, "total": total, "body": body},
+        )
+        for idx, item in enumerate(items):
+            collection["items"][offset + idx] = item
+    return collections
+
+
+def make_page(collection, offset, size):
+    offset_param, size_param, items_key, is_page_idx = collection["scheme"]
+    items = [
+        collection["items"][idx]
+        for idx in range(offset, min(offset + size, collection["total"]))
+        if idx in collection["items"]
+    ]
+    body = dict(collection["body"])
+    body[items_key] = items
+    if is_page_idx:
+        body["paging"] = {
+            "pageIndex": offset // size + 1,
+            "pageSize": size,
+            "total": collection["total"],
+        }
+    else:
+        body.update(
+            {
+                offset_param: offset,
+                size_param: size,
+                "total": collection["total"],
+            }
+        )
+    return json.dumps(body).encode()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # Set by `serve`
+    exchanges = {}
+    collections = {}
+    latency = 0
+    max_page_size = None
+    error_rate = 0
+    limiter = None
+
+    def simulate_server(self):
+        """Delays the response and answers with the simulated rate limit
+        and server errors. Returns if the request was answered by them.
+        """
+        if self.latency:
+            sleep(random.uniform(0.5, 1.5) * self.latency)
+
+        if self.limiter and not self.limiter.try_acquire():
+            retry_after = max(1, round(1 / self.limiter.rate))
+            self.send_body(429, b"", {"Retry-After": str(retry_after)})
+            return True
+        if random.random() < self.error_rate:
+            self.send_body(503, b"", {"Retry-After": "1"})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.simulate_server():
+            return
+
+        scheme, offset, size, base_path = split_paging_params(self.path)
+        exchange = self.exchanges.get(self.path)
+        capped = self.max_page_size and size and size > self.max_page_size
+        if base_path in self.collections and (capped or not exchange):
+            if capped:
+                size = self.max_page_size
+            body = make_page(self.collections[base_path], offset, size)
+            headers = {"Content-Type": "application/json"}
+            self.send_body(200, body, headers)
+        else:
+            self.send_exchange(exchange)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.simulate_server():
+            return
+        self.send_exchange(self.exchanges.get(get_post_key(self.path, body)))
+
+    def send_exchange(self, exchange):
+        if exchange:
+            headers = {
+                k: v
+                for k, v in exchange["headers"].items()
+                if k in ("Content-Type", "ETag", "Last-Modified")
+            }
+            self.send_body(exchange["status_code"], exchange["body"], headers)
+        else:
+            self.send_body(404, b'{"errorMessages": ["Not recorded"]}', {})
+
+    def send_body(self, status_code, body, headers):
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(
+    fnames,
+    port=8000,
+    latency=0,
+    max_page_size=None,
+    error_rate=0,
+    max_rps=None,
+):
+    exchanges = load_archives(fnames)
+    ReplayHandler.exchanges = exchanges
+    ReplayHandler.collections = index_pages(exchanges)
+    ReplayHandler.latency = latency
+    ReplayHandler.max_page_size = max_page_size
+    ReplayHandler.error_rate = error_rate
+    if max_rps:
+        ReplayHandler.limiter = TokenBucket(max_rps, burst=max(1, max_rps))
+
+    print(f"Replaying {len(exchanges)} exchanges on port {port}...")
+    server = ThreadingHTTPServer(("", port), ReplayHandler)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    msg = "Serve recorded HTTP exchanges of the collectors."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "archives",
+        metavar="archive",
+        type=str,
+        nargs="+",
+        help="Recorded fixture archives",
+    )
+    parser.add_argument("--port", type=int, default=8000, help="Port")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Mean delay of every response in seconds.",
+    )
+    parser.add_argument(
+        "--max-page-size",
+        type=int,
+        default=None,
+        help="Serve at most this many items per page of paged APIs.",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests that are answered with 503.",
+    )
+    parser.add_argument(
+        "--max-rps",
+        type=float,
+        default=None,
+        help="Answer requests beyond this rate with 429.",
+    )
+
+    args = parser.parse_args()
+    serve(
+        args.archives,
+        port=args.port,
+        latency=args.latency,
+        max_page_size=args.max_page_size,
+        error_rate=args.error_rate,
+        max_rps=args.max_rps,
+    )
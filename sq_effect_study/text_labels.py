@@ -0,0 +1,129 @@
+"""Labels commit messages and issue descriptions with the `LABEL_PATTERNS`
+from `config.py` in a single pass over the texts.
+
+All patterns are compiled into one regular expression, a sequence of
+optional lookaheads with a named group each. The lookaheads do not consume
+the text, so the matches of different labels may overlap, and every label
+that matches in a text is found, e.g., both `jira_key` and `sonar` in
+`RATIS-1 Sonar`.
+
+The result is a sparse matrix with a row per text and a column per label,
+which counts the matches of the label in the text.
+
+```
+python sq_effect_study/text_labels.py data/input data/output
+```
+
+labels the commits and the JIRA issues of the case systems and stores the
+matrix as `text_labels.npz` together with `text_labels.csv`, which
+identifies the text of each row.
+"""
+import os
+import re
+import argparse
+import pandas as pd
+from contextlib import closing
+from scipy import sparse
+from sq_effect_study.config import LABEL_PATTERNS
+from sq_effect_study.commit_store import open_store, query_commits
+from sq_effect_study.jira_query import get_jira_dump_fname
+
+
+SYSTEMS = ["daffodil", "groovy", "hadoop-ozone", "karaf", "ratis"]
+
+
+class TextLabeler:
+    def __init__(self, label_patterns=LABEL_PATTERNS):
+        self.labels = list(label_patterns.keys())
+        self._columns = {label: idx for idx, label in enumerate(self.labels)}
+        # Matches the empty string at every position, the groups tell which
+        # labels match there
+        self.regex = re.compile(
+            "".join(
+                f"(?=(?P<{label}>{pattern}))?"
+                for label, pattern in label_patterns.items()
+            )
+        )
+
+    def label(self, text):
+        """Returns the labels of all matches in the text."""
+        if not isinstance(text, str):
+            return []
+        return [
+            label
+            for m in self.regex.finditer(text)
+            for label, value in m.groupdict().items()
+            if value is not None
+        ]
+
+    def label_texts(self, texts):
+        """Returns a sparse matrix of the counts of the labels per text."""
+        rows = []
+        cols = []
+        no_texts = 0
+        for row, text in enumerate(texts):
+            no_texts += 1
+            for label in self.label(text):
+                rows.append(row)
+                cols.append(self._columns[label])
+        # Duplicate entries are summed up
+        return sparse.csr_matrix(
+            ([1] * len(rows), (rows, cols)),
+            shape=(no_texts, len(self.labels)),
+            dtype="int32",
+        )
+
+
+def get_corpus(inpath):
+    """Returns the commit messages and the issue descriptions of the case
+    systems together with a frame that identifies them.
+    """
+    index_rows = []
+    texts = []
+    for sys_name in SYSTEMS:
+        repo_path = os.path.join(os.environ["HOME"], "case_systems", sys_name)
+        with closing(open_store(repo_path)) as conn:
+            cdf = query_commits(conn, sys_name)
+        index_rows += [(sys_name, "commit", h) for h in cdf.hash]
+        texts += list(cdf.msg)
+
+        idf = pd.read_csv(get_jira_dump_fname(inpath, sys_name))
+        index_rows += [(sys_name, "issue", k) for k in idf.key]
+        texts += list(idf.description)
+    index_df = pd.DataFrame(index_rows, columns=["project", "kind", "id"])
+    return index_df, texts
+
+
+def main(inpath, outpath):
+    index_df, texts = get_corpus(inpath)
+    labeler = TextLabeler()
+    counts = labeler.label_texts(texts)
+
+    sparse.save_npz(os.path.join(outpath, "text_labels.npz"), counts)
+    index_df.to_csv(os.path.join(outpath, "text_labels.csv"), index=False)
+
+    label_df = pd.DataFrame.sparse.from_spmatrix(
+        counts, columns=labeler.labels
+    )
+    label_df = pd.concat([index_df[["project", "kind"]], label_df > 0], axis=1)
+    print(label_df.groupby(["project", "kind"]).sum())
+
+
+if __name__ == "__main__":
+    msg = "Label the commits and issues of the case systems."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument(
+        "inpath",
+        metavar="inpath",
+        type=str,
+        help="Path",
+    )
+    parser.add_argument(
+        "outpath",
+        metavar="outpath",
+        type=str,
+        help="Path",
+    )
+
+    args = parser.parse_args()
+    main(args.inpath, args.outpath)
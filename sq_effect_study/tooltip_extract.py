@@ -0,0 +1,113 @@
+"""Extraction of the tooltip rows from SonarCloud activity pages.
+
+Every backend returns the rows of the tooltip as a list of pairs, one per
+`<tr>` with the given CSS class. Each pair holds the texts of all `<td>` and
+the texts of all `<span>` elements in that row.
+
+- `html5lib` parses the complete page with BeautifulSoup. It is slow but
+  follows the HTML standard exactly.
+- `fast` jumps directly to the tooltip table in the page source and
+  tokenizes only that table with the streaming parser from the standard
+  library.
+"""
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+
+def extract_rows_html5lib(page_source, css_class):
+    soup = BeautifulSoup(page_source, "html5lib")
+    rows = []
+    for tr in soup.find_all("tr", attrs={"class": css_class}):
+        tds = [td.text for td in tr.find_all("td")]
+        spans = [span.text for span in tr.find_all("span")]
+        rows.append((tds, spans))
+    return rows
+
+
+class TooltipRowParser(HTMLParser):
+    def __init__(self, css_class):
+        super().__init__(convert_charrefs=True)
+        self.css_class = css_class
+        self.rows = []
+        self._row = None
+        # Currently open `<td>` and `<span>` elements of the current row
+        self._open = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._end_row()
+            classes = (dict(attrs).get("class") or "").split()
+            if self.css_class in classes:
+                self._row = ([], [])
+        elif self._row is None:
+            return
+        elif tag == "td":
+            # A new cell implicitly closes a previous one
+            self._close("td")
+            self._row[0].append("")
+            self._open.append(("td", len(self._row[0]) - 1))
+        elif tag == "span":
+            self._row[1].append("")
+            self._open.append(("span", len(self._row[1]) - 1))
+
+    def handle_endtag(self, tag):
+        if tag in ("tr", "tbody", "table"):
+            self._end_row()
+        elif tag in ("td", "span"):
+            self._close(tag)
+
+    def handle_data(self, data):
+        for tag, idx in self._open:
+            texts = self._row[0] if tag == "td" else self._row[1]
+            texts[idx] += data
+
+    def close(self):
+        super().close()
+        self._end_row()
+
+    def _close(self, tag):
+        for pos in range(len(self._open) - 1, -1, -1):
+            if self._open[pos][0] == tag:
+                del self._open[pos:]
+                return
+
+    def _end_row(self):
+        if self._row is not None:
+            self.rows.append(self._row)
+        self._row = None
+        self._open = []
+
+
+def extract_rows_fast(page_source, css_class):
+    rows = []
+    end = 0
+    pos = page_source.find(css_class)
+    while pos >= 0:
+        # Only tokenize the table that contains the tooltip rows, from the
+        # start tag of the `<tr>` that contains the match. Matches elsewhere,
+        # e.g., in texts, scripts, or other tags, are skipped.
+        start = page_source.rfind("<tr", end, pos)
+        if (
+            start < 0
+            or not page_source[start + 3].isspace()
+            or ">" in page_source[start:pos]
+        ):
+            pos = page_source.find(css_class, pos + len(css_class))
+            continue
+        end = page_source.find("</table>", pos)
+        if end < 0:
+            end = len(page_source)
+
+        parser = TooltipRowParser(css_class)
+        parser.feed(page_source[start:end])
+        parser.close()
+        rows += parser.rows
+
+        pos = page_source.find(css_class, end)
+    return rows
+
+
+EXTRACTORS = {
+    "html5lib": extract_rows_html5lib,
+    "fast": extract_rows_fast,
+}